@@ -1,93 +1,171 @@
 # In app.py
 
-import dash
-from dash import dcc, html, Input, Output, State, dash_table
-import pandas as pd
-import numpy as np
-import plotly.express as px
-from datetime import date, timedelta
-
-# --- Import Your Backend Logic ---
-from data_feeder import get_stock_data
-from risk_calculator import calculate_portfolio_returns, calculate_historical_var_es
-from portfolio_optimizer import get_final_allocation, calculate_portfolio_performance
-from ticker_fetcher import fetch_sp500_df # Corrected import
-from stock_screener import find_uncorrelated_stocks
-from data_cacher import get_sp500_price_data
+from startup_profiler import timed_phase, get_startup_report, finish_startup
+
+with timed_phase('imports'):
+    import dash
+    from dash import dcc, html, Input, Output, State, dash_table, ClientsideFunction
+    import pandas as pd
+    import numpy as np
+
+    # --- Import Your Backend Logic ---
+    from price_store import coverage_warning, get_lookback_window, get_price_window, get_return_window, load_universe_prices
+    from risk_calculator import calculate_historical_var_es
+    from portfolio_optimizer import get_final_allocation, calculate_portfolio_performance
+    from share_allocator import allocate_shares
+    from risk_attribution import calculate_risk_contributions
+    from stress_tester import run_stress_tests, load_scenarios
+    from universe_stats import load_universe_stats
+    from ticker_fetcher import load_sp500_df
+    from stock_screener import find_uncorrelated_stocks
+    from whatif_session import get_whatif_session
+    from rest_api import register_api
+    from universe_optimizer import find_best_additions
+
+# Assumptions shared by the preview, the final optimization and the S&P 500 search.
+RISK_FREE_RATE = 0.02
+MAX_ALLOCATION = 0.35
 
 # --- Load Data on App Startup ---
-print("Loading master ticker list...")
-sp500_df = fetch_sp500_df()
-sp500_options = [{'label': f"{row['Symbol']} - {row['Security']}", 'value': row['Symbol']} for index, row in sp500_df.iterrows()]
-sp500_lookup_df = sp500_df.rename(columns={'Symbol': 'Ticker', 'Security': 'Company Name'})
-print(f"Successfully loaded {len(sp500_options)} tickers.")
+# Under gunicorn --preload (see gunicorn.conf.py) this runs once in the master process,
+# and the forked workers share these read-only objects copy-on-write.
+with timed_phase('ticker list'):
+    print("Loading master ticker list...")
+    sp500_df = load_sp500_df()
+    sp500_options = [{'label': f"{symbol} - {security}", 'value': symbol} for symbol, security in zip(sp500_df['Symbol'], sp500_df['Security'])]
+    sp500_search_keys = [option['label'].lower() for option in sp500_options]
+    sp500_lookup_df = sp500_df.rename(columns={'Symbol': 'Ticker', 'Security': 'Company Name'})
+    print(f"Successfully loaded {len(sp500_options)} tickers.")
+
+with timed_phase('universe price cache'):
+    load_universe_prices()
+
+with timed_phase('universe statistics'):
+    load_universe_stats()
+
+with timed_phase('stress scenarios'):
+    load_scenarios()
 
 # --- App Initialization ---
 app = dash.Dash(__name__, external_stylesheets=['style.css'])
 server = app.server
+register_api(server)
 
 # --- App Layout ---
-app.layout = html.Div([
-    html.H1("Quantitative Portfolio Optimizer"),
-    dcc.Store(id='intermediate-data-store'),
+def build_layout():
+    """Builds the (immutable) page layout once, at startup."""
+    return html.Div([
+        html.H1("Quantitative Portfolio Optimizer"),
+        dcc.Store(id='intermediate-data-store'),
+        dcc.Store(id='holdings-store', data={}),
     
-    html.Div(className='app-container', children=[
-        # Left Column: Inputs
-        html.Div(className='left-column', children=[
-            html.Div(className='card', children=[
-                html.H3("1. Build Your Current Portfolio"),
-                html.Label("Search and Select a Stock", className='input-label'),
-                html.Div(className='input-row', children=[
-                    dcc.Dropdown(id='add-ticker-dropdown', options=sp500_options, placeholder='Type to search...'),
-                    dcc.Input(id='add-shares-input', placeholder='Shares', type='number', n_submit=0),
-                    html.Button('Add', id='add-stock-button', n_clicks=0, className='button')
+        html.Div(className='app-container', children=[
+            # Left Column: Inputs
+            html.Div(className='left-column', children=[
+                html.Div(className='card', children=[
+                    html.H3("1. Build Your Current Portfolio"),
+                    html.Label("Search and Select a Stock", className='input-label'),
+                    html.Div(className='input-row', children=[
+                        dcc.Dropdown(id='add-ticker-dropdown', options=[], placeholder='Type to search...'),
+                        dcc.Input(id='add-shares-input', placeholder='Shares', type='number', n_submit=0),
+                        html.Button('Add', id='add-stock-button', n_clicks=0, className='button')
+                    ]),
+                    html.Div(id='portfolio-list-container'),
+                    html.Button('Analyze Current Portfolio', id='analyze-button', n_clicks=0, className='button', style={'width': '100%', 'marginTop': '20px', 'backgroundColor': '#007bff'})
                 ]),
-                html.Div(id='portfolio-list-container'),
-                html.Button('Analyze Current Portfolio', id='analyze-button', n_clicks=0, className='button', style={'width': '100%', 'marginTop': '20px', 'backgroundColor': '#007bff'})
+                html.Div(id='optimization-card', className='card', style={'display': 'none'}, children=[
+                    html.H3("2. Define Optimization Goal"),
+                    html.Label("Select stocks to include in optimization:", className='input-label'),
+                    dcc.Checklist(id='candidate-checklist', options=[], value=[], labelStyle={'display': 'block', 'marginBottom': '5px'}),
+                    html.Div(id='whatif-preview', style={'marginTop': '10px', 'fontSize': '0.9em'}),
+                    html.Label("Or let the optimizer pick new stocks from the whole S&P 500:", className='input-label', style={'marginTop': '15px'}),
+                    html.Div(className='input-row', children=[
+                        dcc.Input(id='num-new-stocks-input', type='number', value=5, min=1, max=20),
+                        html.Button('Suggest Best Additions', id='universe-search-button', n_clicks=0, className='button')
+                    ]),
+                    html.Label("New Capital to Invest ($)", className='input-label', style={'marginTop': '15px'}),
+                    dcc.Input(id='budget-input', type='number', value=20000, style={'width': '95%'}),
+                    html.Label("Risk Profile", className='input-label', style={'marginTop': '15px'}),
+                    dcc.Dropdown(id='risk-profile-dropdown',
+                        options=[
+                            {'label': 'Minimum Risk', 'value': 'min_risk'},
+                            {'label': 'Balanced (Risk Parity)', 'value': 'balanced'},
+                            {'label': 'High Growth (Return Target)', 'value': 'high_growth'}
+                        ],
+                        value='balanced'),
+                    html.Label("Allow Selling?", className='input-label', style={'marginTop': '15px'}),
+                    dcc.Dropdown(id='sell-enabled-dropdown',
+                        options=[{'label': 'Yes', 'value': 'True'}, {'label': 'No', 'value': 'False'}],
+                        value='True'),
+                    html.Button('Find Optimal Portfolio', id='optimize-button', n_clicks=0, className='button', style={'width': '100%', 'marginTop': '20px'})
+                ])
             ]),
-            html.Div(id='optimization-card', className='card', style={'display': 'none'}, children=[
-                html.H3("2. Define Optimization Goal"),
-                html.Label("Select stocks to include in optimization:", className='input-label'),
-                dcc.Checklist(id='candidate-checklist', options=[], value=[], labelStyle={'display': 'block', 'marginBottom': '5px'}),
-                html.Label("New Capital to Invest ($)", className='input-label', style={'marginTop': '15px'}),
-                dcc.Input(id='budget-input', type='number', value=20000, style={'width': '95%'}),
-                html.Label("Risk Profile", className='input-label', style={'marginTop': '15px'}),
-                dcc.Dropdown(id='risk-profile-dropdown',
-                    options=[
-                        {'label': 'Minimum Risk', 'value': 'min_risk'},
-                        {'label': 'Balanced (Risk Parity)', 'value': 'balanced'},
-                        {'label': 'High Growth (Return Target)', 'value': 'high_growth'}
-                    ],
-                    value='balanced'),
-                html.Label("Allow Selling?", className='input-label', style={'marginTop': '15px'}),
-                dcc.Dropdown(id='sell-enabled-dropdown',
-                    options=[{'label': 'Yes', 'value': 'True'}, {'label': 'No', 'value': 'False'}],
-                    value='True'),
-                html.Button('Find Optimal Portfolio', id='optimize-button', n_clicks=0, className='button', style={'width': '100%', 'marginTop': '20px'})
-            ])
-        ]),
-        # Right Column: Outputs
-        html.Div(className='right-column', children=[
-            html.Div(className='card', children=[
-                html.H3("Analysis & Recommendations"),
-                dcc.Loading(id="loading-spinner", type="circle",
-                    children=html.Div(id='results-output', children=["Build your portfolio and click 'Analyze' to begin."]))
+            # Right Column: Outputs
+            html.Div(className='right-column', children=[
+                html.Div(className='card', children=[
+                    html.H3("Analysis & Recommendations"),
+                    dcc.Loading(id="loading-spinner", type="circle",
+                        children=html.Div(id='results-output', children=["Build your portfolio and click 'Analyze' to begin."]))
+                ])
             ])
         ])
     ])
-])
 
-# --- Callback to add stocks to the list ---
+with timed_phase('layout'):
+    app.layout = build_layout()
+
+# --- Shared Output Components ---
+def build_data_warning(prices, start_date, end_date):
+    message = coverage_warning(prices, start_date, end_date)
+    return html.P(f"Warning: {message}", style={'color': '#b8860b', 'fontWeight': 'bold'}) if message else None
+
+def build_stress_table(portfolio_weights):
+    stress_results = run_stress_tests(portfolio_weights)
+    if stress_results.empty:
+        return html.P("No stress scenarios are available.")
+    stress_df = stress_results.rename_axis('Scenario').reset_index()
+    return dash_table.DataTable(
+        columns=[{"name": "Scenario", "id": "Scenario"}] + [{"name": c, "id": c, "type": "numeric", "format": dash_table.FormatTemplate.percentage(2)} for c in stress_results.columns],
+        data=stress_df.to_dict('records'),
+        style_cell={'textAlign': 'left', 'padding': '5px'},
+        style_header={'backgroundColor': '#4a47a3', 'color': 'white', 'fontWeight': 'bold'}
+    )
+
+# --- Ticker search: only the matches for what has been typed are sent to the browser ---
+MAX_SEARCH_RESULTS = 20
+
 @app.callback(
-    Output('portfolio-list-container', 'children'),
+    Output('add-ticker-dropdown', 'options'),
+    Input('add-ticker-dropdown', 'search_value'),
+    State('add-ticker-dropdown', 'value')
+)
+def search_tickers(search_value, selected_ticker):
+    selected = [option for option in sp500_options if option['value'] == selected_ticker]
+    if not search_value:
+        return selected
+    query = search_value.lower()
+    # Ticker-prefix matches first, then any other label containing the query.
+    prefix = sorted((i for i, option in enumerate(sp500_options) if option['value'].lower().startswith(query)),
+                    key=lambda i: len(sp500_options[i]['value']))
+    prefix_set = set(prefix)
+    contains = [i for i, key in enumerate(sp500_search_keys) if query in key and i not in prefix_set]
+    matches = [sp500_options[i] for i in (prefix + contains)[:MAX_SEARCH_RESULTS]]
+    return matches + [option for option in selected if option not in matches]
+
+# --- Holdings are edited in the browser (assets/holdings.js) ---
+app.clientside_callback(
+    ClientsideFunction(namespace='portfolio', function_name='addHolding'),
+    Output('holdings-store', 'data'),
     [Input('add-stock-button', 'n_clicks'), Input('add-shares-input', 'n_submit')],
-    [State('add-ticker-dropdown', 'value'), State('add-shares-input', 'value'), State('portfolio-list-container', 'children')],
+    [State('add-ticker-dropdown', 'value'), State('add-shares-input', 'value'), State('holdings-store', 'data')],
     prevent_initial_call=True
 )
-def add_stock_to_list(n_clicks, n_submit, ticker, shares, current_children):
-    if not ticker or not isinstance(shares, (int, float)) or shares <= 0: return current_children
-    new_item = html.Div(f"{ticker.upper()}: {int(shares)}", className='portfolio-item')
-    return (current_children or []) + [new_item]
+
+app.clientside_callback(
+    ClientsideFunction(namespace='portfolio', function_name='renderHoldings'),
+    Output('portfolio-list-container', 'children'),
+    Input('holdings-store', 'data')
+)
 
 # --- Callback for STAGE 1: Analyze Current Portfolio & Suggest Hedges ---
 @app.callback(
@@ -97,22 +175,21 @@ def add_stock_to_list(n_clicks, n_submit, ticker, shares, current_children):
     Output('candidate-checklist', 'value'),
     Output('intermediate-data-store', 'data'),
     Input('analyze-button', 'n_clicks'),
-    State('portfolio-list-container', 'children'),
+    State('holdings-store', 'data'),
     prevent_initial_call=True
 )
-def analyze_current_portfolio(n_clicks, portfolio_items):
-    if not portfolio_items:
+def analyze_current_portfolio(n_clicks, holdings):
+    if not holdings:
         return html.Div("Please add stocks to your portfolio first."), {'display': 'none'}, [], [], {}
     
-    holdings = {item['props']['children'].split(':')[0].strip(): int(item['props']['children'].split(':')[1].strip()) for item in portfolio_items}
+    holdings = {ticker: int(shares) for ticker, shares in holdings.items()}
     tickers = list(holdings.keys())
     
     try:
-        END_DATE = date.today().strftime('%Y-%m-%d')
-        START_DATE = (date.today() - timedelta(days=2*365)).strftime('%Y-%m-%d')
+        START_DATE, END_DATE = get_lookback_window()
         CONFIDENCE_LEVEL = 0.99
         
-        price_data = get_stock_data(tickers, START_DATE, END_DATE)
+        price_data = get_price_window(tickers, START_DATE, END_DATE)
         if price_data.empty: return html.Div("Error fetching price data."), {'display': 'none'}, [], [], {}
 
         latest_prices = price_data.iloc[-1]
@@ -120,10 +197,10 @@ def analyze_current_portfolio(n_clicks, portfolio_items):
         current_dollar_values = current_shares * latest_prices
         current_total_value = current_dollar_values.sum()
         current_weights = current_dollar_values / current_total_value if current_total_value > 0 else pd.Series([0.0]*len(tickers), index=tickers)
-        returns = price_data.pct_change().dropna()
+        returns = get_return_window(tickers, START_DATE, END_DATE)
         mean_returns = returns.mean()
         cov_matrix = returns.cov()
-        current_returns_ts = calculate_portfolio_returns(price_data, current_weights.values)
+        current_returns_ts = returns.dot(current_weights.reindex(returns.columns).values)
         current_hist_var, _ = calculate_historical_var_es(current_returns_ts, CONFIDENCE_LEVEL)
         current_ann_return, current_ann_volatility = calculate_portfolio_performance(current_weights.values, mean_returns, cov_matrix)
 
@@ -131,6 +208,15 @@ def analyze_current_portfolio(n_clicks, portfolio_items):
         elif 0.15 <= current_ann_volatility < 0.25: risk_level, risk_color = "Moderate Risk", "#fd7e14"
         else: risk_level, risk_color = "High Risk", "#dc3545"
             
+        risk_contributions = calculate_risk_contributions(current_weights.reindex(returns.columns).values, returns, CONFIDENCE_LEVEL)
+        contribution_df = risk_contributions[['Weight', 'Volatility %', 'Historical VaR %']].rename_axis('Ticker').reset_index()
+        contribution_table = dash_table.DataTable(
+            columns=[{"name": "Ticker", "id": "Ticker"}] + [{"name": c, "id": c, "type": "numeric", "format": dash_table.FormatTemplate.percentage(2)} for c in ['Weight', 'Volatility %', 'Historical VaR %']],
+            data=contribution_df.to_dict('records'),
+            style_cell={'textAlign': 'left', 'padding': '5px'},
+            style_header={'backgroundColor': 'var(--primary-color)', 'color': 'white', 'fontWeight': 'bold'}
+        )
+
         hedging_suggestions = find_uncorrelated_stocks(current_returns_ts)
         
         if hedging_suggestions.empty:
@@ -140,7 +226,7 @@ def analyze_current_portfolio(n_clicks, portfolio_items):
             hedging_df = hedging_suggestions.reset_index().rename(columns={'index': 'Ticker'})
             merged_df = pd.merge(hedging_df, sp500_lookup_df, on='Ticker', how='left')
             if '12m Return' not in merged_df.columns: merged_df['12m Return'] = np.nan
-            merged_df.fillna({'12m Return': 0, 'Company Name': 'N/A'}, inplace=True)
+            merged_df.fillna({'Company Name': 'N/A'}, inplace=True)
             final_hedging_df = merged_df[['Ticker', 'Company Name', 'Correlation', '12m Return']]
             
             hedging_table = dash_table.DataTable(
@@ -158,12 +244,15 @@ def analyze_current_portfolio(n_clicks, portfolio_items):
         checklist_values = tickers
         
         results_layout = html.Div([
+            build_data_warning(price_data, START_DATE, END_DATE),
             html.Div(className='kpi-container', children=[
                 html.Div(className='kpi-card', children=[html.P("Est. Annualized Return", className='kpi-title'), html.P(f"{current_ann_return:.2%}", className='kpi-value')]),
                 html.Div(className='kpi-card', children=[html.P("Annualized Volatility (Risk)", className='kpi-title'), html.P(f"{current_ann_volatility:.2%}", className='kpi-value')]),
                 html.Div(className='kpi-card', children=[html.P(f"Historical VaR ({CONFIDENCE_LEVEL:.0%})", className='kpi-title'), html.P(f"{current_hist_var:.2%}", className='kpi-value')])
             ]),
             html.Div(className='risk-profile-container', style={'backgroundColor': risk_color}, children=[html.P("Your Current Portfolio Risk Profile is:", className='risk-profile-title'), html.P(risk_level, className='risk-profile-text')]),
+            html.Hr(), html.H4("Risk Contribution by Holding"), contribution_table,
+            html.Hr(), html.H4("Stress Test: Portfolio Return by Scenario"), build_stress_table(current_weights.rename('Current Portfolio')),
             html.Hr(), html.H4("Hedging & Diversification Suggestions"), html.P("Consider adding one of these S&P 500 stocks to potentially reduce risk."),
             hedging_table, html.Hr(), html.P("Now, select the stocks to include in the optimization below and define your goal.", style={'textAlign': 'center', 'fontStyle': 'italic'})
         ])
@@ -174,6 +263,80 @@ def analyze_current_portfolio(n_clicks, portfolio_items):
         import traceback
         return html.Div([html.H4("An error occurred during analysis:"), html.Pre(f"{e}\n\n{traceback.format_exc()}")]), {'display': 'none'}, [], [], {}
 
+# --- Callback for STAGE 1b: Pick the Best K Additions from the Full S&P 500 ---
+@app.callback(
+    Output('candidate-checklist', 'options', allow_duplicate=True),
+    Output('candidate-checklist', 'value', allow_duplicate=True),
+    Input('universe-search-button', 'n_clicks'),
+    [State('num-new-stocks-input', 'value'), State('sell-enabled-dropdown', 'value'), State('budget-input', 'value'),
+     State('intermediate-data-store', 'data'), State('candidate-checklist', 'options'), State('candidate-checklist', 'value')],
+    prevent_initial_call=True
+)
+def suggest_universe_additions(n_clicks, num_new_stocks, sell_enabled_str, budget, intermediate_data, current_options, current_values):
+    holdings = (intermediate_data or {}).get('holdings', {})
+    if not holdings or not num_new_stocks:
+        return current_options, current_values
+
+    try:
+        START_DATE, END_DATE = get_lookback_window()
+        price_data = get_price_window(list(holdings), START_DATE, END_DATE)
+        if price_data.empty:
+            return current_options, current_values
+        holding_values = pd.Series(holdings).reindex(price_data.columns) * price_data.iloc[-1]
+        selection = find_best_additions(holding_values / holding_values.sum(), int(num_new_stocks), MAX_ALLOCATION,
+                                        sell_enabled=(sell_enabled_str == 'True'), start_date=START_DATE, end_date=END_DATE,
+                                        current_value=holding_values.sum(), budget=budget or 0)
+    except Exception as e:
+        # The outputs are the checklist itself, so a failed search leaves it as it was.
+        import traceback
+        print(f"S&P 500 search failed: {e}\n{traceback.format_exc()}")
+        return current_options, current_values
+
+    company_names = sp500_lookup_df.set_index('Ticker')['Company Name']
+    known = {option['value'] for option in current_options}
+    new_options = [{'label': f"{t} ({company_names.get(t, 'N/A')}) - S&P 500 pick", 'value': t} for t in selection['selected'] if t not in known]
+    return current_options + new_options, list(dict.fromkeys(list(holdings) + selection['selected']))
+
+# --- Callback for STAGE 1c: Instant What-If Preview as Candidates Are Toggled ---
+@app.callback(
+    Output('whatif-preview', 'children'),
+    [Input('candidate-checklist', 'value'), Input('risk-profile-dropdown', 'value'), Input('sell-enabled-dropdown', 'value')],
+    [State('candidate-checklist', 'options'), State('intermediate-data-store', 'data')],
+    prevent_initial_call=True
+)
+def preview_candidate_toggle(candidate_tickers, risk_profile, sell_enabled_str, candidate_options, intermediate_data):
+    if not candidate_tickers or not intermediate_data:
+        return None
+
+    holdings = intermediate_data.get('holdings', {})
+    pool_tickers = [option['value'] for option in candidate_options]
+    START_DATE, END_DATE = get_lookback_window()
+    try:
+        # One session per analyzed portfolio and candidate list: each toggle only borders or
+        # trims its covariance factor and re-solves from the previous weights.
+        session = get_whatif_session((tuple(sorted(holdings.items())), tuple(pool_tickers), START_DATE, END_DATE),
+                                     lambda: get_return_window(pool_tickers, START_DATE, END_DATE))
+        selected = [t for t in candidate_tickers if t in session.pool.columns]
+        if len(selected) < 2:
+            return html.P("Select at least two stocks with price data to preview an allocation.")
+
+        latest_prices = get_price_window(pool_tickers, START_DATE, END_DATE).iloc[-1]
+        current_values = pd.Series({t: holdings.get(t, 0) for t in selected}) * latest_prices[selected]
+        current_weights = current_values / current_values.sum() if current_values.sum() > 0 else current_values * 0
+        with session.lock:
+            session.select(selected)
+            weights = session.solve(risk_profile, RISK_FREE_RATE, current_weights, MAX_ALLOCATION, sell_enabled_str == 'True')
+            volatility = session.volatility(weights.values)
+        expected_return = float(weights @ session.pool[weights.index].mean()) * 252
+    except Exception as e:
+        return html.P(f"What-if preview unavailable: {e}", style={'color': '#dc3545'})
+
+    allocation = ', '.join(f"{t} {w:.0%}" for t, w in weights.sort_values(ascending=False).items() if w > 0.005)
+    return html.Div([
+        html.P(f"What-if: Est. Return {expected_return:.2%}, Volatility {volatility:.2%}", style={'fontWeight': 'bold', 'marginBottom': '2px'}),
+        html.P(allocation, style={'marginTop': '0'})
+    ])
+
 # --- Callback for STAGE 2: Run Final Optimization ---
 @app.callback(
     Output('results-output', 'children', allow_duplicate=True),
@@ -191,11 +354,9 @@ def run_final_optimization(n_clicks, candidate_tickers, budget, risk_profile, se
     sell_enabled = (sell_enabled_str == 'True')
     
     try:
-        END_DATE = date.today().strftime('%Y-%m-%d')
-        START_DATE = (date.today() - timedelta(days=2*365)).strftime('%Y-%m-%d')
-        RISK_FREE_RATE = 0.02
+        START_DATE, END_DATE = get_lookback_window()
         
-        original_price_data = get_stock_data(original_tickers, START_DATE, END_DATE)
+        original_price_data = get_price_window(original_tickers, START_DATE, END_DATE)
         if original_price_data.empty and original_tickers:
             return html.Div("Error: Could not fetch data for original portfolio.")
         original_latest_prices = original_price_data.iloc[-1]
@@ -203,7 +364,7 @@ def run_final_optimization(n_clicks, candidate_tickers, budget, risk_profile, se
         original_dollar_values = original_shares * original_latest_prices
         original_weights = original_dollar_values / original_total_value if original_total_value > 0 else pd.Series([0.0]*len(original_tickers), index=original_tickers)
 
-        candidate_price_data = get_stock_data(candidate_tickers, START_DATE, END_DATE)
+        candidate_price_data = get_price_window(candidate_tickers, START_DATE, END_DATE)
         if candidate_price_data.empty: return html.Div("Error: Could not fetch data for selected candidates.", style={'color': 'red'})
         
         latest_prices = candidate_price_data.iloc[-1].reindex(candidate_tickers)
@@ -213,15 +374,19 @@ def run_final_optimization(n_clicks, candidate_tickers, budget, risk_profile, se
         candidate_current_total_value = candidate_current_dollar_values.sum()
         candidate_current_weights = candidate_current_dollar_values / candidate_current_total_value if candidate_current_total_value > 0 else pd.Series([0.0]*len(candidate_tickers), index=candidate_tickers)
         
-        returns = candidate_price_data.pct_change().dropna()
+        returns = get_return_window(candidate_tickers, START_DATE, END_DATE)
         mean_returns = returns.mean()
         cov_matrix = returns.cov()
         
-        final_weights = get_final_allocation(mean_returns, cov_matrix, risk_profile, RISK_FREE_RATE, candidate_current_weights.values, 0.35, sell_enabled)
+        final_weights, diagnostics = get_final_allocation(mean_returns, cov_matrix, risk_profile, RISK_FREE_RATE, candidate_current_weights.values, MAX_ALLOCATION, sell_enabled,
+                                                          num_starts=8, return_diagnostics=True)
+        profile_note = None
+        if diagnostics['profile'] != risk_profile:
+            profile_note = html.P(f"Note: the optimizer used the '{diagnostics['profile']}' profile instead of '{risk_profile}'.",
+                                  style={'color': '#b8860b', 'fontWeight': 'bold'})
         
         new_total_value = original_total_value + budget
-        optimal_dollar_allocation = new_total_value * final_weights
-        optimal_shares_target = np.floor(optimal_dollar_allocation / latest_prices)
+        optimal_shares_target, leftover_cash, final_allocations = allocate_shares(final_weights, latest_prices, new_total_value)
         
         trades_required = optimal_shares_target - candidate_current_shares
         trades_required[(candidate_current_shares == 0) & (optimal_shares_target == 0)] = 0
@@ -229,10 +394,10 @@ def run_final_optimization(n_clicks, candidate_tickers, budget, risk_profile, se
         action_plan_df = pd.DataFrame({'Ticker': candidate_tickers, 'Current Shares': list(candidate_current_shares.astype(int)), 'Target Shares': list(optimal_shares_target.astype(int)), 'Action': [f"BUY {int(s)}" if s > 0 else f"SELL {abs(int(s))}" if s < 0 else "HOLD" for s in trades_required.values]})
         
         target_dollar_values = optimal_shares_target * latest_prices
-        actual_target_value = target_dollar_values.sum()
-        final_allocations = target_dollar_values / actual_target_value if actual_target_value > 0 else pd.Series([0.0]*len(candidate_tickers), index=candidate_tickers)
         allocation_df = pd.DataFrame({'Ticker': candidate_tickers, 'Target Value ($)': list(target_dollar_values.astype(float)), 'Allocation': list(final_allocations.astype(float))})
 
+        # Plotly Express is only needed for these charts, so it is imported on first use.
+        import plotly.express as px
         pie_charts = html.Div(className='pie-chart-container', children=[
             dcc.Graph(figure=px.pie(names=original_tickers, values=original_weights.values, title='Original Portfolio Allocation', hole=.3)),
             dcc.Graph(figure=px.pie(names=candidate_tickers, values=final_allocations.values, title='New Optimal Allocation', hole=.3))
@@ -254,17 +419,29 @@ def run_final_optimization(n_clicks, candidate_tickers, budget, risk_profile, se
         )
 
         return [
+            build_data_warning(candidate_price_data, START_DATE, END_DATE),
+            profile_note,
             pie_charts,
             html.H4("Action Plan", style={'marginTop': '30px'}),
             action_plan_table,
             html.H4("Final Target Allocation", style={'marginTop': '30px'}),
-            allocation_table
+            allocation_table,
+            html.H4("Stress Test: Original vs. Optimal", style={'marginTop': '30px'}),
+            build_stress_table(pd.DataFrame({'Original': original_weights, 'Optimal': final_allocations}).T.fillna(0)),
+            html.P(f"Leftover Cash: ${leftover_cash:,.2f}", style={'marginTop': '20px', 'fontWeight': 'bold'})
         ]
 
     except Exception as e:
         import traceback
         return html.Div([html.H4("An unexpected error occurred:", style={'color': 'red'}), html.Pre(f"{e}\n\n{traceback.format_exc()}")])
 
+# --- Startup Diagnostics ---
+@server.route('/health/startup')
+def startup_report():
+    return get_startup_report()
+
+finish_startup()
+
 # --- Run the App ---
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
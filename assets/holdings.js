@@ -0,0 +1,25 @@
+/* Client-side callbacks for the holdings list (see app.py).
+   Holdings live in the 'holdings-store' dcc.Store as {TICKER: shares}, so adding a
+   stock never needs a server round-trip. */
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    portfolio: {
+        addHolding: function(n_clicks, n_submit, ticker, shares, holdings) {
+            if (!ticker || typeof shares !== 'number' || shares <= 0) {
+                return window.dash_clientside.no_update;
+            }
+            const updated = Object.assign({}, holdings || {});
+            updated[ticker.toUpperCase()] = Math.floor(shares);
+            return updated;
+        },
+
+        renderHoldings: function(holdings) {
+            return Object.entries(holdings || {}).map(function([ticker, shares]) {
+                return {
+                    type: 'Div',
+                    namespace: 'dash_html_components',
+                    props: {children: ticker + ': ' + shares, className: 'portfolio-item'}
+                };
+            });
+        }
+    }
+});
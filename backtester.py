@@ -0,0 +1,159 @@
+# In backtester.py
+
+import io
+import numpy as np
+import pandas as pd
+from contextlib import redirect_stdout, nullcontext
+from concurrent.futures import ProcessPoolExecutor
+
+from portfolio_optimizer import get_final_allocation
+from price_store import load_universe_prices
+
+
+class RollingMoments:
+    """
+    Keeps the sum and cross-product of a sliding block of return rows, so the
+    window mean and covariance can be moved forward by adding the new rows and
+    subtracting the dropped ones instead of recomputing returns.cov() each time.
+    """
+
+    def __init__(self, returns, start, end):
+        self.returns = returns
+        self.start, self.end = start, end
+        window = returns[start:end]
+        self.total = window.sum(axis=0)
+        self.cross = window.T @ window
+
+    def advance(self, new_end):
+        """Slides the window forward so that it covers [new_end - length, new_end)."""
+        new_start = new_end - (self.end - self.start)
+        if new_start >= self.end:
+            # The jump is longer than the window, so nothing carries over.
+            self.__init__(self.returns, new_start, new_end)
+            return
+        dropped = self.returns[self.start:new_start]
+        added = self.returns[self.end:new_end]
+        self.total += added.sum(axis=0) - dropped.sum(axis=0)
+        self.cross += added.T @ added - dropped.T @ dropped
+        self.start, self.end = new_start, new_end
+
+    def mean_cov(self):
+        n = self.end - self.start
+        mean = self.total / n
+        cov = (self.cross - n * np.outer(mean, mean)) / (n - 1)
+        return mean, cov
+
+
+def _segment_path(segment_returns, weights):
+    """
+    Buy-and-hold value path (starting at 1) of a portfolio over one holding period,
+    plus the drifted weights at its end.
+    """
+    growth = np.cumprod(1 + segment_returns, axis=0)
+    values = growth @ weights
+    drifted = weights * growth[-1]
+    drifted = drifted / drifted.sum() if drifted.sum() > 0 else weights
+    return values, drifted
+
+
+def run_backtest(tickers, target_profile, start_date=None, end_date=None, lookback=252,
+                 rebalance_every=21, risk_free_rate=0.02, max_allocation=0.35,
+                 transaction_cost=0.0, prices=None, verbose=False):
+    """
+    Walks rebalance dates over the cached price matrix and re-optimizes at each one.
+
+    Args:
+        tickers (list): Assets the strategy may hold.
+        target_profile (str): 'min_risk', 'balanced' or 'high_growth'.
+        start_date, end_date (str): Optional limits on the price history used.
+        lookback (int): Number of return observations used to estimate each solve.
+        rebalance_every (int): Trading days between rebalances.
+        risk_free_rate (float): Passed through to get_final_allocation.
+        max_allocation (float): Per-asset weight cap.
+        transaction_cost (float): Cost per unit of turnover, deducted on rebalance days.
+        prices (pd.DataFrame): Price matrix to use instead of the universe cache.
+        verbose (bool): Show the optimizer's own progress messages.
+
+    Returns:
+        dict: 'returns', 'equity', 'drawdown' (pd.Series by date), 'turnover' and
+        'weights' (indexed by rebalance date) and a 'summary' dict of statistics.
+    """
+    if prices is None:
+        prices = load_universe_prices()
+    prices = prices[[t for t in tickers if t in prices.columns]]
+    if start_date or end_date:
+        prices = prices.loc[start_date:end_date]
+    returns_df = prices.pct_change().dropna()
+    if len(returns_df) <= lookback or returns_df.shape[1] < 2:
+        raise ValueError("Not enough price history or assets to run the backtest.")
+
+    returns = returns_df.values
+    num_days, num_assets = returns.shape
+    rebalance_rows = list(range(lookback, num_days, rebalance_every))
+
+    moments = RollingMoments(returns, 0, lookback)
+    weights = None
+    drifted = np.zeros(num_assets)
+    daily_returns = np.empty(num_days - lookback)
+    weight_rows, turnover = [], []
+
+    for i, row in enumerate(rebalance_rows):
+        if row != moments.end:
+            moments.advance(row)
+        mean, cov = moments.mean_cov()
+
+        with nullcontext() if verbose else redirect_stdout(io.StringIO()):
+            weights = get_final_allocation(mean, cov, target_profile, risk_free_rate, None,
+                                           max_allocation, True, initial_weights=weights)
+
+        trade = np.abs(weights - drifted).sum()
+        turnover.append(trade)
+        weight_rows.append(weights)
+
+        next_row = rebalance_rows[i + 1] if i + 1 < len(rebalance_rows) else num_days
+        values, drifted = _segment_path(returns[row:next_row], weights)
+        segment = values / np.concatenate([[1.0], values[:-1]]) - 1
+        segment[0] -= transaction_cost * trade
+        daily_returns[row - lookback:next_row - lookback] = segment
+
+    dates = returns_df.index[lookback:]
+    portfolio_returns = pd.Series(daily_returns, index=dates, name=target_profile)
+    equity = (1 + portfolio_returns).cumprod()
+    drawdown = equity / equity.cummax() - 1
+    rebalance_dates = returns_df.index[rebalance_rows]
+
+    years = len(portfolio_returns) / 252
+    annual_vol = portfolio_returns.std() * np.sqrt(252)
+    annual_return = equity.iloc[-1] ** (1 / years) - 1 if years > 0 else 0.0
+    summary = {
+        'profile': target_profile,
+        'annual_return': annual_return,
+        'annual_volatility': annual_vol,
+        'sharpe': (annual_return - risk_free_rate) / annual_vol if annual_vol > 0 else np.nan,
+        'max_drawdown': drawdown.min(),
+        'average_turnover': float(np.mean(turnover)),
+    }
+
+    return {
+        'returns': portfolio_returns,
+        'equity': equity,
+        'drawdown': drawdown,
+        'turnover': pd.Series(turnover, index=rebalance_dates),
+        'weights': pd.DataFrame(weight_rows, index=rebalance_dates, columns=returns_df.columns),
+        'summary': summary,
+    }
+
+
+def _run_config(config):
+    return run_backtest(**config)
+
+
+def run_backtests(configs, max_workers=None):
+    """
+    Runs independent backtests (one dict of run_backtest keyword arguments each)
+    across a process pool and returns the results in the same order.
+    """
+    if len(configs) <= 1:
+        return [run_backtest(**config) for config in configs]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(_run_config, configs))
@@ -1,23 +1,39 @@
 # In data_feeder.py
 
 import pandas as pd
-import yfinance as yf
 
 def get_stock_data(tickers, start_date, end_date):
     """
     Fetches historical closing prices. This version is resilient to individual ticker failures
     and correctly handles data cleaning to prevent warnings and bugs.
     """
+    return get_stock_data_with_volumes(tickers, start_date, end_date)[0]
+
+def get_stock_data_with_volumes(tickers, start_date, end_date):
+    """
+    Fetches closing prices (cleaned as in get_stock_data) and daily share volumes
+    from one download. Volumes feed the liquidity statistics in universe_stats;
+    failed tickers are dropped and missing days are left as NaN.
+
+    Returns:
+        tuple: (prices, volumes) DataFrames, both empty if the download fails.
+    """
+    # yfinance is slow to import and only needed on a cache miss, so load it on first use.
+    import yfinance as yf
+
     print(f"Attempting to download data for {len(tickers)} tickers...")
     try:
         full_data = yf.download(tickers, start=start_date, end=end_date)
         if full_data.empty:
-            return pd.DataFrame()
+            return pd.DataFrame(), pd.DataFrame()
 
         close_prices = full_data['Close']
+        volumes = full_data['Volume']
         
         if isinstance(close_prices, pd.Series):
             close_prices = close_prices.to_frame(name=tickers[0])
+            volumes = volumes.to_frame(name=tickers[0])
+        volumes = volumes.dropna(axis='columns', how='all')
 
         # --- DEFINITIVE FIX FOR DATA INTEGRITY ---
         # 1. Create a clean copy to work on, which prevents SettingWithCopyWarning.
@@ -31,11 +47,11 @@ def get_stock_data(tickers, start_date, end_date):
         # --- END OF FIX ---
         
         if clean_prices.empty:
-            return pd.DataFrame()
+            return pd.DataFrame(), volumes
 
         print(f"Successfully processed data for: {len(clean_prices.columns)} tickers.")
-        return clean_prices
+        return clean_prices, volumes
 
     except Exception as e:
         print(f"An unexpected error occurred in get_stock_data: {e}")
-        return pd.DataFrame()
\ No newline at end of file
+        return pd.DataFrame(), pd.DataFrame()
@@ -0,0 +1,15 @@
+# In gunicorn.conf.py
+# Picked up automatically by `gunicorn app:server` when run from the project directory.
+
+import gc
+
+# Import app.py (layout, ticker list, price and scenario caches) once in the master
+# process; forked workers then share those objects copy-on-write instead of each
+# rebuilding them.
+preload_app = True
+
+
+def when_ready(server):
+    # Move everything loaded so far into the permanent GC generation, so the
+    # collectors in the workers do not touch (and therefore copy) those pages.
+    gc.freeze()
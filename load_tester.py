@@ -0,0 +1,241 @@
+# In load_tester.py
+"""
+Concurrent-session load test for the Dash app.
+
+Each simulated user runs the real browser flow against Dash's callback endpoint
+(/_dash-update-component): analyze a random S&P 500 portfolio, then optimize it
+together with some of the suggested hedges. For every gunicorn worker count the
+script reports p50/p95/p99 latency and throughput, so deployments can be sized
+and concurrency regressions caught.
+
+    python load_tester.py --workers 1 2 4 --sessions 16 --iterations 3
+    python load_tester.py --url http://127.0.0.1:8050 --sessions 8   # an already running app
+
+The spawned servers run `load_tester:create_offline_server()`, i.e. the normal app
+with its network price sources replaced by a deterministic stand-in, so results
+do not depend on (or hammer) Yahoo Finance.
+"""
+
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+CALLBACK_PATH = '/_dash-update-component'
+PROFILES = ['min_risk', 'balanced', 'high_growth']
+
+
+# --- Offline price stand-in ---
+def _offline_close_prices(tickers, start_date, end_date):
+    """Deterministic random-walk closes for tickers outside the price cache (seeded by ticker)."""
+    dates = pd.bdate_range(start_date, end_date, name='Date')
+    columns = {}
+    for ticker in tickers:
+        rng = np.random.default_rng(sum(ticker.encode()))
+        columns[ticker] = 100 * np.exp(np.cumsum(rng.normal(0.0003, 0.015, len(dates))))
+    return pd.DataFrame(columns, index=dates)
+
+
+def create_offline_server():
+    """gunicorn entry point: the app's Flask server with every network price source stubbed out."""
+    import price_fetcher
+    import price_store
+    price_fetcher.fetch_close_prices = _offline_close_prices
+    price_store.get_stock_data = _offline_close_prices
+    from app import server
+    return server
+
+
+# --- Dash callback protocol ---
+def _parse_outputs(output):
+    """Splits a dependency's output spec ('a.b' or '..a.b...c.d..') into Dash's outputs list."""
+    specs = output[2:-2].split('...') if output.startswith('..') else [output]
+    outputs = []
+    for spec in specs:
+        component_id, prop = spec.rsplit('.', 1)
+        outputs.append({'id': component_id, 'property': prop})
+    return outputs
+
+
+def find_callbacks(dependencies):
+    """Maps each callback's first input ('id.property') to its dependency spec from /_dash-dependencies."""
+    return {f"{d['inputs'][0]['id']}.{d['inputs'][0]['property']}": d for d in dependencies if d['inputs']}
+
+
+def callback_payload(dependency, input_values, state_values):
+    """Builds the JSON body the Dash renderer would POST for this callback."""
+    outputs = _parse_outputs(dependency['output'])
+    return {
+        'output': dependency['output'],
+        'outputs': outputs if dependency['output'].startswith('..') else outputs[0],
+        'inputs': [dict(spec, value=input_values[spec['id']]) for spec in dependency['inputs']],
+        'state': [dict(spec, value=state_values.get(spec['id'], {}).get(spec['property']))
+                  for spec in dependency['state']],
+        'changedPropIds': [f"{spec['id']}.{spec['property']}" for spec in dependency['inputs']],
+    }
+
+
+def _failed(response_text):
+    # The app's callbacks catch their own exceptions and render an error panel instead.
+    return 'error occurred' in response_text or 'Error fetching' in response_text
+
+
+# --- One simulated user ---
+def simulate_session(post, callbacks, universe, iterations=1, seed=0):
+    """
+    Runs iterations of analyze -> optimize for one user.
+
+    Args:
+        post (callable): post(path, payload) -> (status_code, response_text, parsed_json).
+        callbacks (dict): Output of find_callbacks.
+        universe (list): Tickers to draw portfolios from.
+
+    Returns:
+        list: One (callback name, seconds, ok) tuple per request.
+    """
+    rng = np.random.default_rng(seed)
+    timings = []
+
+    def call(name, payload):
+        started = time.perf_counter()
+        status, text, body = post(CALLBACK_PATH, payload)
+        ok = status == 200 and not _failed(text)
+        timings.append((name, time.perf_counter() - started, ok))
+        return body if ok else None
+
+    for _ in range(iterations):
+        tickers = list(rng.choice(universe, size=int(rng.integers(3, 7)), replace=False))
+        holdings = {t: int(rng.integers(1, 50)) for t in tickers}
+        analysis = call('analyze', callback_payload(
+            callbacks['analyze-button.n_clicks'], {'analyze-button': 1}, {'holdings-store': {'data': holdings}}))
+        if analysis is None:
+            continue
+
+        response = analysis['response']
+        suggested = [option['value'] for option in response['candidate-checklist']['options']
+                     if option['value'] not in tickers]
+        candidates = tickers + suggested[:int(rng.integers(0, 3))]
+        call('optimize', callback_payload(
+            callbacks['optimize-button.n_clicks'], {'optimize-button': 1}, {
+                'candidate-checklist': {'value': candidates},
+                'budget-input': {'value': 20000},
+                'risk-profile-dropdown': {'value': str(rng.choice(PROFILES))},
+                'sell-enabled-dropdown': {'value': str(rng.choice(['True', 'False']))},
+                'intermediate-data-store': {'data': response['intermediate-data-store']['data']},
+            }))
+    return timings
+
+
+def summarize(timings, seconds):
+    """Latency percentiles (ms) and throughput per callback, plus an 'all' row."""
+    frame = pd.DataFrame(timings, columns=['callback', 'seconds', 'ok'])
+    rows = []
+    for name, group in [*frame.groupby('callback'), ('all', frame)]:
+        latency_ms = group['seconds'].values * 1000
+        rows.append({
+            'callback': name,
+            'requests': len(group),
+            'errors': int((~group['ok']).sum()),
+            'p50_ms': np.percentile(latency_ms, 50),
+            'p95_ms': np.percentile(latency_ms, 95),
+            'p99_ms': np.percentile(latency_ms, 99),
+            'throughput_rps': len(group) / seconds if seconds > 0 else np.nan,
+        })
+    return pd.DataFrame(rows)
+
+
+# --- Driving a server over HTTP ---
+def run_load_test(base_url, sessions=8, iterations=2, seed=0):
+    """Runs `sessions` concurrent users against a running app and returns summarize()'s table."""
+    import requests
+
+    http = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=sessions, pool_maxsize=sessions)
+    http.mount('http://', adapter)
+    callbacks = find_callbacks(http.get(base_url + '/_dash-dependencies', timeout=30).json())
+    # The ticker dropdown is filled lazily by search, so portfolios are drawn from the local price cache.
+    from price_store import load_universe_prices
+    universe = list(load_universe_prices().columns)
+
+    def post(path, payload):
+        response = http.post(base_url + path, json=payload, timeout=300)
+        return response.status_code, response.text, response.json() if response.ok else None
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as executor:
+        results = list(executor.map(lambda i: simulate_session(post, callbacks, universe, iterations, seed + i),
+                                    range(sessions)))
+    elapsed = time.perf_counter() - started
+    return summarize([timing for result in results for timing in result], elapsed)
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _wait_until_up(base_url, process, timeout=120):
+    import requests
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("gunicorn exited before the app came up.")
+        try:
+            if requests.get(base_url + '/health/startup', timeout=2).ok:
+                return
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"The app did not come up within {timeout}s.")
+
+
+def sweep_worker_counts(worker_counts=(1, 2, 4), sessions=8, iterations=2, threads=1, seed=0):
+    """Starts gunicorn with each worker count in turn and load-tests it; returns one combined table."""
+    tables = []
+    for workers in worker_counts:
+        port = _free_port()
+        base_url = f'http://127.0.0.1:{port}'
+        command = [sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py', '--workers', str(workers),
+                   '--threads', str(threads), '--timeout', '300', '--bind', f'127.0.0.1:{port}',
+                   'load_tester:create_offline_server()']
+        print(f"Starting gunicorn with {workers} worker(s)...")
+        process = subprocess.Popen(command, cwd=os.path.dirname(os.path.abspath(__file__)),
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            _wait_until_up(base_url, process)
+            table = run_load_test(base_url, sessions, iterations, seed)
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+        table.insert(0, 'workers', workers)
+        tables.append(table)
+    return pd.concat(tables, ignore_index=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4], help="gunicorn worker counts to sweep")
+    parser.add_argument('--threads', type=int, default=1, help="gunicorn threads per worker")
+    parser.add_argument('--sessions', type=int, default=8, help="concurrent simulated users")
+    parser.add_argument('--iterations', type=int, default=2, help="analyze -> optimize rounds per user")
+    parser.add_argument('--url', help="load-test an already running app instead of spawning gunicorn")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.url:
+        table = run_load_test(args.url.rstrip('/'), args.sessions, args.iterations, args.seed)
+    else:
+        table = sweep_worker_counts(args.workers, args.sessions, args.iterations, args.threads, args.seed)
+    with pd.option_context('display.float_format', '{:,.1f}'.format, 'display.width', 120):
+        print(table.to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,236 @@
+# In multistart_optimizer.py
+
+import atexit
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+
+import numpy as np
+from scipy.optimize import minimize
+
+from portfolio_optimizer import risk_parity_scale
+
+# Worker processes are started once and reused, since starting a fresh pool per
+# click would cost more than the solves themselves.
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool(max_workers):
+    """
+    The process's solver pool, sized on first use. Workers come from a forkserver
+    rather than a fork of the caller: a gunicorn worker has request threads and the
+    price-fetcher loop running, and forking a multithreaded process can deadlock.
+    """
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('forkserver'))
+            _pool_pid = os.getpid()
+        return _pool
+
+
+@atexit.register
+def _shutdown_pool():
+    if _pool is not None and _pool_pid == os.getpid():
+        _pool.shutdown(wait=False, cancel_futures=True)
+
+
+# --- Objective (same risk-parity measure as get_final_allocation) ---
+def risk_contributions(weights, cov_matrix, periods_per_year=252):
+    """Each asset's contribution to annualized portfolio volatility, as in get_final_allocation."""
+    marginal = cov_matrix @ weights
+    portfolio_vol = np.sqrt(weights @ marginal) * np.sqrt(periods_per_year)
+    if portfolio_vol == 0:
+        return np.zeros_like(weights)
+    return weights * marginal / portfolio_vol
+
+
+def _risk_parity_objective(weights, cov_matrix, periods_per_year, scale=1.0):
+    return np.std(risk_contributions(weights, cov_matrix, periods_per_year)) / scale
+
+
+def _dispersion(weights, cov_matrix, periods_per_year):
+    """Spread of the risk contributions relative to their mean (0 = perfect parity)."""
+    contributions = risk_contributions(weights, cov_matrix, periods_per_year)
+    mean = contributions.mean()
+    return float(np.std(contributions) / mean) if mean > 0 else np.inf
+
+
+# --- Starting points ---
+def project_to_bounds(weights, lower, upper):
+    """Closest point to weights (in the shift sense) inside lower <= w <= upper with sum(w) == 1."""
+    lo, hi = -1.0 - weights.max(), 1.0 - weights.min()
+    for _ in range(100):
+        shift = (lo + hi) / 2
+        if np.clip(weights + shift, lower, upper).sum() > 1:
+            hi = shift
+        else:
+            lo = shift
+    return np.clip(weights + (lo + hi) / 2, lower, upper)
+
+
+def starting_points(cov_matrix, lower, upper, num_starts, initial_weights=None, seed=0):
+    """
+    Diversified feasible starts: the caller's warm start (if any), equal weights,
+    inverse volatility and inverse variance, then random Dirichlet draws.
+
+    Returns:
+        list: (label, weights) pairs, num_starts long.
+    """
+    n = len(cov_matrix)
+    variances = np.maximum(np.diag(cov_matrix), 1e-12)
+    candidates = []
+    if initial_weights is not None:
+        candidates.append(('warm start', np.asarray(initial_weights, dtype=float)))
+    candidates += [
+        ('equal weight', np.full(n, 1.0 / n)),
+        ('inverse volatility', 1 / np.sqrt(variances) / (1 / np.sqrt(variances)).sum()),
+        ('inverse variance', 1 / variances / (1 / variances).sum()),
+    ]
+    rng = np.random.default_rng(seed)
+    while len(candidates) < num_starts:
+        candidates.append((f'random {len(candidates)}', rng.dirichlet(np.ones(n))))
+    return [(label, project_to_bounds(w, lower, upper)) for label, w in candidates[:num_starts]]
+
+
+# --- Solving one start ---
+def _solve_from_start(cov_matrix, stop_flag, label, start, lower, upper, periods_per_year):
+    def stop_requested(intermediate_result):
+        if stop_flag[0]:
+            raise StopIteration
+
+    scale = risk_parity_scale(cov_matrix, periods_per_year)
+    started = time.perf_counter()
+    result = minimize(_risk_parity_objective, start, args=(cov_matrix, periods_per_year, scale), method='SLSQP',
+                      bounds=list(zip(lower, upper)), callback=stop_requested, options={'ftol': 1e-10, 'maxiter': 500},
+                      constraints=[{'type': 'eq', 'fun': lambda w: np.sum(w) - 1}])
+    feasible = bool(abs(result.x.sum() - 1) < 1e-6 and np.all(result.x >= lower - 1e-8) and np.all(result.x <= upper + 1e-8))
+    return {
+        'start': label,
+        'weights': result.x,
+        'objective': float(_risk_parity_objective(result.x, cov_matrix, periods_per_year)),
+        'dispersion': _dispersion(result.x, cov_matrix, periods_per_year),
+        'success': bool(result.success),
+        'feasible': feasible,
+        'message': str(result.message),
+        'iterations': int(result.nit),
+        'seconds': time.perf_counter() - started,
+    }
+
+
+def _solve_in_worker(shm_name, n, label, start, lower, upper, periods_per_year):
+    """Pool entry point: reads the covariance (and the stop flag after it) from shared memory."""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    shared = np.ndarray((n * n + 1,), dtype=np.float64, buffer=shm.buf)
+    try:
+        if shared[n * n]:
+            return None
+        return _solve_from_start(shared[:n * n].reshape(n, n), shared[n * n:], label, start, lower, upper, periods_per_year)
+    finally:
+        # Every view into the buffer must be gone before the segment can be closed.
+        del shared
+        shm.close()
+
+
+def optimize_risk_parity(cov_matrix, max_allocation, lower_bounds=None, num_starts=8, max_workers=None,
+                         tolerance=1e-3, periods_per_year=252, initial_weights=None, seed=0):
+    """
+    Multi-start SLSQP for the risk-parity ('balanced') objective of get_final_allocation.
+
+    The objective is non-smooth, so one start often stalls. Here num_starts
+    diversified starts are solved across a process pool that reads the covariance
+    from shared memory. As soon as one feasible solution has a risk-contribution
+    dispersion (std / mean) within tolerance, the other starts are cancelled or
+    stopped at their next iteration.
+
+    Args:
+        cov_matrix (array-like): Asset covariance of periodic returns.
+        max_allocation (float): Per-asset weight cap (relaxed to 1 if the caps cannot sum to 1).
+        lower_bounds (array-like): Optional per-asset minimum weights (e.g. when selling is disabled).
+        num_starts (int): Number of starting points.
+        max_workers (int): Size of the shared process pool, capped at num_starts and the CPU
+            count (fixed when the pool is first created). When that leaves one worker,
+            the starts are solved in this process.
+        tolerance (float): Dispersion at which the search stops early.
+        periods_per_year (int): Annualization factor of the covariance's return frequency.
+        initial_weights (array-like): Optional warm start, tried first.
+        seed (int): Seed for the random starts.
+
+    Returns:
+        dict: 'weights' of the best feasible start (None if no start was feasible), its
+        'objective', 'dispersion' and 'success', plus 'feasible', 'stopped_early',
+        'relaxed_bounds', 'seconds' and per-start diagnostics under 'starts'.
+    """
+    started = time.perf_counter()
+    cov_matrix = np.ascontiguousarray(cov_matrix, dtype=np.float64)
+    n = len(cov_matrix)
+    upper = np.full(n, float(max_allocation))
+    relaxed_bounds = upper.sum() < 1
+    if relaxed_bounds:
+        upper[:] = 1.0
+    lower = np.zeros(n) if lower_bounds is None else np.minimum(np.asarray(lower_bounds, dtype=float), upper)
+    starts = starting_points(cov_matrix, lower, upper, num_starts, initial_weights, seed)
+
+    runs = []
+    stopped_early = False
+
+    def good_enough(run):
+        return run is not None and run['feasible'] and run['dispersion'] <= tolerance
+
+    cpu_count = os.cpu_count() or 1
+    workers = min(max_workers or cpu_count, cpu_count, len(starts))
+    if workers == 1:
+        stop_flag = np.zeros(1)
+        for label, start in starts:
+            runs.append(_solve_from_start(cov_matrix, stop_flag, label, start, lower, upper, periods_per_year))
+            if good_enough(runs[-1]):
+                stopped_early = len(runs) < len(starts)
+                break
+    else:
+        shm = shared_memory.SharedMemory(create=True, size=(n * n + 1) * 8)
+        try:
+            shared = np.ndarray((n * n + 1,), dtype=np.float64, buffer=shm.buf)
+            shared[:n * n] = cov_matrix.ravel()
+            shared[n * n] = 0.0
+            pool = _get_pool(workers)
+            pending = {pool.submit(_solve_in_worker, shm.name, n, label, start, lower, upper, periods_per_year)
+                       for label, start in starts}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    run = future.result()
+                    if run is not None:
+                        runs.append(run)
+                    if good_enough(run) and pending:
+                        stopped_early = True
+                        shared[n * n] = 1.0
+                        for other in pending:
+                            other.cancel()
+                        pending = {other for other in pending if not other.cancelled()}
+            # Keep runs in start order so the diagnostics read the same every time.
+            order = [label for label, _ in starts]
+            runs.sort(key=lambda run: order.index(run['start']))
+        finally:
+            del shared
+            shm.close()
+            shm.unlink()
+
+    feasible = [run for run in runs if run['feasible']]
+    best = min(feasible, key=lambda run: run['objective']) if feasible else None
+    return {
+        'weights': None if best is None else best['weights'],
+        'objective': None if best is None else best['objective'],
+        'dispersion': None if best is None else best['dispersion'],
+        'success': best is not None and best['success'],
+        'best_start': None if best is None else best['start'],
+        'feasible': best is not None,
+        'stopped_early': stopped_early,
+        'relaxed_bounds': bool(relaxed_bounds),
+        'seconds': time.perf_counter() - started,
+        'starts': [{key: value for key, value in run.items() if key != 'weights'} for run in runs],
+    }
@@ -2,27 +2,65 @@
 
 import numpy as np
 import pandas as pd
-from scipy.optimize import minimize
+from scipy.optimize import OptimizeResult, minimize
 
-def calculate_portfolio_performance(weights, mean_returns, cov_matrix):
-    """Calculates the annualized return and volatility for a given set of weights."""
+def calculate_portfolio_performance(weights, mean_returns, cov_matrix, periods_per_year=252):
+    """
+    Calculates the annualized return and volatility for a given set of weights.
+    periods_per_year matches the return frequency (252 daily, 52 weekly, 12 monthly).
+    """
     weights = np.array(weights)
-    returns = np.sum(mean_returns * weights) * 252
-    std_dev = np.sqrt(np.dot(weights.T, np.dot(cov_matrix, weights))) * np.sqrt(252)
+    returns = np.sum(mean_returns * weights) * periods_per_year
+    std_dev = np.sqrt(np.dot(weights.T, np.dot(cov_matrix, weights))) * np.sqrt(periods_per_year)
     return returns, std_dev
 
+def risk_parity_scale(cov_matrix, periods_per_year=252):
+    """
+    A typical per-asset risk contribution, used to bring the risk-parity objective
+    (~1e-5 unscaled, below SLSQP's default ftol) to order one without moving its minimizer.
+    """
+    variances = np.diag(np.asarray(cov_matrix))
+    return np.sqrt(np.mean(variances) * periods_per_year) / len(variances)
+
 def get_final_allocation(mean_returns, cov_matrix, target_profile, risk_free_rate, 
-                         current_weights, max_allocation, sell_enabled):
+                         current_weights, max_allocation, sell_enabled, initial_weights=None,
+                         periods_per_year=252, num_starts=1, max_workers=None, return_diagnostics=False):
     """
     Determines the final optimal weights with a robust, multi-profile strategy
     and a final cleaning step to remove numerical noise.
+
+    initial_weights optionally warm-starts the solver (e.g. from the previous
+    rebalance); by default it starts from equal weights. periods_per_year must
+    match the frequency of the returns behind mean_returns and cov_matrix.
+
+    With num_starts > 1 the 'balanced' profile is solved from that many starting
+    points across a process pool (see multistart_optimizer.optimize_risk_parity),
+    and the best feasible risk-parity solution is kept instead of falling back to
+    minimum risk. With return_diagnostics=True the result is (weights, diagnostics),
+    where diagnostics records the profile actually used, any fallback taken and
+    the solver's status.
     """
+    diagnostics = {'requested_profile': target_profile, 'fallback': None, 'multistart': None}
+
+    def finish(weights):
+        diagnostics['profile'] = target_profile
+        return (weights, diagnostics) if return_diagnostics else weights
+
     num_assets = len(mean_returns)
-    initial_weights = np.array(num_assets * [1. / num_assets,])
+    equal_weights = np.array(num_assets * [1. / num_assets,])
+    warm_start = initial_weights
+    if initial_weights is None:
+        initial_weights = equal_weights
+    else:
+        initial_weights = np.clip(np.asarray(initial_weights, dtype=float), 0, max_allocation)
+        initial_weights = initial_weights / initial_weights.sum() if initial_weights.sum() > 0 else equal_weights
+        warm_start = initial_weights
 
     # --- Define Objective Functions ---
     def portfolio_volatility(weights):
-        return calculate_portfolio_performance(weights, mean_returns, cov_matrix)[1]
+        return calculate_portfolio_performance(weights, mean_returns, cov_matrix, periods_per_year)[1]
+
+    parity_scale = risk_parity_scale(cov_matrix, periods_per_year)
 
     def risk_contribution_objective(weights):
         weights = np.array(weights)
@@ -30,10 +68,10 @@ def get_final_allocation(mean_returns, cov_matrix, target_profile, risk_free_rat
         if portfolio_vol == 0: return 0
         marginal_contribution = cov_matrix.dot(weights)
         risk_contribution = weights * marginal_contribution / portfolio_vol
-        return np.std(risk_contribution)
+        return np.std(risk_contribution) / parity_scale
 
     def negative_portfolio_return(weights):
-        return -calculate_portfolio_performance(weights, mean_returns, cov_matrix)[0]
+        return -calculate_portfolio_performance(weights, mean_returns, cov_matrix, periods_per_year)[0]
 
     # --- Define Constraints and Bounds ---
     constraints = [{'type': 'eq', 'fun': lambda w: np.sum(w) - 1}]
@@ -45,7 +83,7 @@ def get_final_allocation(mean_returns, cov_matrix, target_profile, risk_free_rat
             constraints.append({'type': 'ineq', 'fun': lambda w, i=i: w[i] - current_weights[i]})
 
     # --- Intelligent Profile Switching ---
-    avg_expected_return = calculate_portfolio_performance(initial_weights, mean_returns, cov_matrix)[0]
+    avg_expected_return = calculate_portfolio_performance(equal_weights, mean_returns, cov_matrix, periods_per_year)[0]
     if target_profile == 'balanced' and avg_expected_return < risk_free_rate:
         print("\nWARNING: Expected returns are low/negative. Switching 'Balanced' to 'Minimum Risk'.")
         target_profile = 'min_risk'
@@ -55,35 +93,53 @@ def get_final_allocation(mean_returns, cov_matrix, target_profile, risk_free_rat
         print("Optimizing for: Minimum Risk")
         result = minimize(portfolio_volatility, initial_weights, method='SLSQP', bounds=bounds, constraints=constraints)
     
+    elif target_profile == 'balanced' and num_starts > 1:
+        print(f"Optimizing for: Balanced (Risk Parity, {num_starts} starts)")
+        # Imported here so the process-pool machinery stays off the startup path.
+        from multistart_optimizer import optimize_risk_parity
+        lower_bounds = current_weights if not sell_enabled and current_weights is not None else None
+        multistart = optimize_risk_parity(np.asarray(cov_matrix), max_allocation, lower_bounds, num_starts, max_workers,
+                                          periods_per_year=periods_per_year, initial_weights=warm_start)
+        diagnostics['multistart'] = multistart
+        result = OptimizeResult(x=multistart['weights'], success=multistart['feasible'],
+                                message=f"Best of {len(multistart['starts'])} starts: {multistart['best_start']}")
+
     elif target_profile == 'balanced':
         print("Optimizing for: Balanced (Risk Parity)")
         result = minimize(risk_contribution_objective, initial_weights, method='SLSQP', bounds=bounds, constraints=constraints)
         
     elif target_profile == 'high_growth':
         print("Optimizing for: High Growth (Return Targeting)")
-        individual_returns = mean_returns * 252
+        individual_returns = mean_returns * periods_per_year
         target_return = np.percentile(individual_returns, 75)
         print(f"Setting a target annualized return of {target_return:.2%}")
-        growth_constraints = constraints + [{'type': 'eq', 'fun': lambda w: calculate_portfolio_performance(w, mean_returns, cov_matrix)[0] - target_return}]
+        growth_constraints = constraints + [{'type': 'eq', 'fun': lambda w: calculate_portfolio_performance(w, mean_returns, cov_matrix, periods_per_year)[0] - target_return}]
         result = minimize(portfolio_volatility, initial_weights, method='SLSQP', bounds=bounds, constraints=growth_constraints)
 
     else:
         # Fallback to Minimum Risk if profile is unknown
         result = minimize(portfolio_volatility, initial_weights, method='SLSQP', bounds=bounds, constraints=constraints)
 
+    diagnostics['success'] = bool(result.success)
+    diagnostics['message'] = str(result.message)
+
     # --- Final Fallback ---
     if not result.success:
         print("\nCRITICAL WARNING: Optimization failed. Re-running with a simple Minimum Risk objective.")
+        target_profile = 'min_risk'
+        diagnostics['fallback'] = 'min_risk'
         fallback_constraints = [{'type': 'eq', 'fun': lambda w: np.sum(w) - 1}]
         fallback_result = minimize(portfolio_volatility, initial_weights, method='SLSQP', bounds=bounds, constraints=fallback_constraints)
         
         if not fallback_result.success:
             print("ULTIMATE FALLBACK: Returning an equal-weight portfolio.")
-            return initial_weights
+            target_profile = 'equal_weight'
+            diagnostics['fallback'] = 'equal_weight'
+            return finish(equal_weights)
         
         optimal_weights = fallback_result.x
     else:
-        optimal_weights = result.x
+        optimal_weights = np.array(result.x, dtype=float)
 
     # --- DEFINITIVE FIX: Weight Cleaning ---
     # 1. Set any weights that are extremely close to zero to be exactly 0.
@@ -94,4 +150,4 @@ def get_final_allocation(mean_returns, cov_matrix, target_profile, risk_free_rat
         optimal_weights /= np.sum(optimal_weights)
     # --- END OF FIX ---
 
-    return optimal_weights
\ No newline at end of file
+    return finish(optimal_weights)
\ No newline at end of file
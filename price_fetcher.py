@@ -0,0 +1,151 @@
+# In price_fetcher.py
+
+import asyncio
+import atexit
+import os
+import threading
+import pandas as pd
+import aiohttp
+
+YAHOO_CHART_URL = 'https://query1.finance.yahoo.com/v8/finance/chart/{ticker}'
+
+# Statuses worth retrying; anything else in the 4xx range means the ticker is bad.
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+def _parse_chart(payload, ticker):
+    """Turns a Yahoo chart API response into a Series of daily closes indexed by date."""
+    result = (payload.get('chart') or {}).get('result') or []
+    if not result or not result[0].get('timestamp'):
+        return pd.Series(dtype=float, name=ticker)
+    result = result[0]
+    indicators = result.get('indicators', {})
+    # Prefer adjusted closes, which is what yf.download returns by default.
+    closes = (indicators.get('adjclose') or [{}])[0].get('adjclose') or indicators['quote'][0]['close']
+    dates = pd.to_datetime(result['timestamp'], unit='s').normalize()
+    prices = pd.Series(closes, index=dates, name=ticker, dtype=float)
+    prices.index.name = 'Date'
+    return prices[~prices.index.duplicated(keep='last')]
+
+
+class AsyncPriceFetcher:
+    """
+    Downloads daily closes for many tickers concurrently over one pooled,
+    keep-alive HTTP session.
+
+    Concurrency is bounded by a semaphore, every ticker gets its own timeout and
+    retries, and concurrent requests for the same (ticker, start, end) share a
+    single in-flight download.
+    """
+
+    def __init__(self, base_url=YAHOO_CHART_URL, max_concurrency=8, timeout=10.0, retries=2, backoff=0.5):
+        self.base_url = base_url
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self._session = None
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._in_flight = {}
+
+    def _get_session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency, keepalive_timeout=30)
+            self._session = aiohttp.ClientSession(connector=connector, headers={'User-Agent': 'Mozilla/5.0'})
+        return self._session
+
+    async def _download(self, ticker, start_date, end_date):
+        params = {
+            'period1': int(pd.Timestamp(start_date).timestamp()),
+            # The end date is inclusive here, as in price_store.
+            'period2': int((pd.Timestamp(end_date) + pd.Timedelta(days=1)).timestamp()),
+            'interval': '1d',
+        }
+        url = self.base_url.format(ticker=ticker)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        for attempt in range(self.retries + 1):
+            try:
+                async with self._semaphore:
+                    async with self._get_session().get(url, params=params, timeout=timeout) as response:
+                        if response.status in RETRYABLE_STATUSES:
+                            raise aiohttp.ClientResponseError(response.request_info, (), status=response.status)
+                        if response.status != 200:
+                            print(f"Price request for {ticker} failed with HTTP {response.status}.")
+                            return pd.Series(dtype=float, name=ticker)
+                        payload = await response.json(content_type=None)
+                return _parse_chart(payload, ticker)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt == self.retries:
+                    print(f"Giving up on {ticker} after {attempt + 1} attempts: {e!r}")
+                    return pd.Series(dtype=float, name=ticker)
+                await asyncio.sleep(self.backoff * 2 ** attempt)
+
+    async def fetch_ticker(self, ticker, start_date, end_date):
+        """Fetches one ticker, joining an identical download that is already in flight."""
+        key = (ticker, str(start_date), str(end_date))
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._download(ticker, start_date, end_date))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        # shield() so that one caller being cancelled does not cancel the shared download.
+        return await asyncio.shield(task)
+
+    async def fetch_prices(self, tickers, start_date, end_date):
+        """
+        Fetches closing prices for all tickers at once.
+
+        Returns:
+            pd.DataFrame: Prices in the requested column order, cleaned the same way
+            as data_feeder.get_stock_data (failed tickers and incomplete rows dropped).
+        """
+        series = await asyncio.gather(*(self.fetch_ticker(t, start_date, end_date) for t in tickers))
+        series = [s for s in series if not s.empty]
+        if not series:
+            return pd.DataFrame()
+        prices = pd.concat(series, axis=1)
+        prices.dropna(axis='columns', how='all', inplace=True)
+        prices.dropna(axis='rows', how='any', inplace=True)
+        return prices
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+
+# --- Shared fetcher for synchronous callers (Dash callbacks run in threads) ---
+# All callers submit to one background event loop, so request coalescing works
+# across sessions. The loop is created lazily and re-created after a fork, so a
+# gunicorn --preload master never hands a running loop thread to its workers.
+_loop = None
+_loop_pid = None
+_fetcher = None
+_lock = threading.Lock()
+
+
+def _get_fetcher_loop():
+    global _loop, _loop_pid, _fetcher
+    with _lock:
+        if _loop is None or _loop_pid != os.getpid():
+            _loop = asyncio.new_event_loop()
+            _loop_pid = os.getpid()
+            threading.Thread(target=_loop.run_forever, name='price-fetcher', daemon=True).start()
+            _fetcher = AsyncPriceFetcher()
+        return _loop, _fetcher
+
+
+@atexit.register
+def _close_shared_fetcher():
+    if _fetcher is not None and _loop_pid == os.getpid() and _loop.is_running():
+        asyncio.run_coroutine_threadsafe(_fetcher.close(), _loop).result(timeout=5)
+
+
+def fetch_close_prices(tickers, start_date, end_date):
+    """Blocking wrapper around the shared AsyncPriceFetcher, for use outside asyncio."""
+    loop, fetcher = _get_fetcher_loop()
+    future = asyncio.run_coroutine_threadsafe(fetcher.fetch_prices(list(tickers), start_date, end_date), loop)
+    try:
+        return future.result()
+    except Exception as e:
+        print(f"An unexpected error occurred in fetch_close_prices: {e}")
+        return pd.DataFrame()
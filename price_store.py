@@ -0,0 +1,305 @@
+# In price_store.py
+
+import threading
+import pandas as pd
+from collections import OrderedDict
+from datetime import date, timedelta
+
+from data_cacher import get_sp500_price_data
+from data_feeder import get_stock_data
+
+# Resampling rules for the supported return frequencies ('daily' needs none).
+FREQUENCY_RULES = {'daily': None, 'weekly': 'W-FRI', 'monthly': 'ME'}
+
+# Return periods per year, used to annualize statistics at each frequency.
+ANNUALIZATION_FACTORS = {'daily': 252, 'weekly': 52, 'monthly': 12}
+
+# How many (tickers, window, frequency) results we keep around.
+MAX_CACHED_WINDOWS = 128
+
+# A window edge may fall this far from the nearest trading day (a weekend plus a
+# holiday) before the data is treated as not covering it.
+COVERAGE_TOLERANCE = pd.Timedelta(days=4)
+
+_universe_prices = None
+_universe_by_frequency = {}
+_window_cache = OrderedDict()
+_window_cache_lock = threading.Lock()
+
+
+def get_lookback_window(years=2, end=None):
+    """
+    Returns the (start_date, end_date) strings for a rolling lookback window.
+    Every callback used to rebuild this from date.today() by hand.
+    """
+    end = end or date.today()
+    start = end - timedelta(days=years * 365)
+    return start.strftime('%Y-%m-%d'), end.strftime('%Y-%m-%d')
+
+
+def load_universe_prices():
+    """
+    Loads the S&P 500 price cache once per process and keeps it sorted by date,
+    so every window request can be answered with a binary search.
+    """
+    global _universe_prices
+    if _universe_prices is None:
+        prices = get_sp500_price_data()
+        if not prices.empty and not prices.index.is_monotonic_increasing:
+            prices = prices.sort_index()
+        _universe_prices = prices
+    return _universe_prices
+
+
+def periods_per_year(frequency):
+    """Annualization factor for a return frequency ('daily' -> 252, 'weekly' -> 52, 'monthly' -> 12)."""
+    if frequency not in ANNUALIZATION_FACTORS:
+        raise ValueError(f"Unknown frequency '{frequency}'. Use one of {list(ANNUALIZATION_FACTORS)}.")
+    return ANNUALIZATION_FACTORS[frequency]
+
+
+def get_universe_frames(frequency='daily'):
+    """
+    Returns the whole universe's (prices, returns) at a frequency. Each frequency is
+    resampled and differenced once per process; the returns frame keeps the same
+    index as the prices (its first row is NaN) so windows can share slice positions.
+    """
+    if frequency not in _universe_by_frequency:
+        prices = _resample(load_universe_prices(), frequency)
+        _universe_by_frequency[frequency] = (prices, prices.pct_change())
+    return _universe_by_frequency[frequency]
+
+
+def slice_dates(prices, start_date, end_date):
+    """
+    Slices a date-sorted price frame to [start_date, end_date] using a binary search
+    on the index instead of a boolean mask over every row.
+    """
+    if prices.empty:
+        return prices
+    index = prices.index
+    lo = index.searchsorted(pd.Timestamp(start_date), side='left')
+    hi = index.searchsorted(pd.Timestamp(end_date), side='right')
+    return prices.iloc[lo:hi]
+
+
+def _resample(prices, frequency):
+    if frequency not in FREQUENCY_RULES:
+        raise ValueError(f"Unknown frequency '{frequency}'. Use one of {list(FREQUENCY_RULES)}.")
+    rule = FREQUENCY_RULES[frequency]
+    if rule is None or prices.empty:
+        return prices
+    return prices.resample(rule).last().dropna(how='all')
+
+
+def _covers(index, start_date, end_date):
+    return len(index) > 0 and index[0] - pd.Timestamp(start_date) <= COVERAGE_TOLERANCE \
+        and pd.Timestamp(end_date) - index[-1] <= COVERAGE_TOLERANCE
+
+
+def coverage_warning(prices, start_date, end_date):
+    """
+    Returns a message when prices do not span [start_date, end_date] (e.g. the cache
+    is stale and the live download failed), or None when they do.
+    """
+    if prices.empty:
+        return f"No price data is available between {start_date} and {end_date}."
+    first, last = prices.index[0], prices.index[-1]
+    problems = []
+    if pd.Timestamp(end_date) - last > COVERAGE_TOLERANCE:
+        problems.append(f"ends on {last:%Y-%m-%d}, so the latest prices may be stale")
+    if first - pd.Timestamp(start_date) > COVERAGE_TOLERANCE:
+        problems.append(f"only starts on {first:%Y-%m-%d}")
+    if not problems:
+        return None
+    return f"Price data for the window {start_date} to {end_date} " + ' and '.join(problems) + "."
+
+
+def _fetch_live(tickers, start_date, end_date):
+    # Imported here to keep aiohttp off the startup path. The bulk yfinance download
+    # is kept as a fallback in case the chart API is unavailable.
+    from price_fetcher import fetch_close_prices
+    fetched = fetch_close_prices(tickers, start_date, end_date)
+    if fetched.empty:
+        fetched = get_stock_data(tickers, start_date, end_date)
+    return fetched
+
+
+def _extend_to_window(prices, start_date, end_date):
+    """
+    Fills the part of [start_date, end_date] the universe cache does not cover with
+    live prices. The live download overlaps the cache by a week and the two are joined
+    at a common date, rescaling the older side, so the latest prices are the live ones
+    and a rebased adjusted close does not show up as a one-day jump.
+
+    Returns:
+        tuple: (prices, extended), where extended is False if a live download needed
+        for the window failed and the cached part is returned as it was.
+    """
+    tickers = list(prices.columns)
+    cache_index = load_universe_prices().index
+    start, end = pd.Timestamp(start_date), pd.Timestamp(end_date)
+    overlap = pd.Timedelta(days=7)
+
+    if prices.empty:
+        # The window lies entirely outside the cache.
+        live = _fetch_live(tickers, start_date, end_date)
+        if set(tickers) <= set(live.columns):
+            return live.reindex(columns=tickers).dropna(), True
+        return prices, False
+
+    extended = True
+    if end - cache_index[-1] > COVERAGE_TOLERANCE:
+        live = _fetch_live(tickers, cache_index[-1] - overlap, end_date)
+        live = live[tickers].dropna() if set(tickers) <= set(live.columns) else live.iloc[:0]
+        common = prices.index.intersection(live.index)
+        if len(common):
+            anchor = common[-1]
+            prices = pd.concat([prices * (live.loc[anchor] / prices.loc[anchor]), live[live.index > anchor]])
+        else:
+            extended = False
+
+    if cache_index[0] - start > COVERAGE_TOLERANCE:
+        live = _fetch_live(tickers, start_date, cache_index[0] + overlap)
+        live = live[tickers].dropna() if set(tickers) <= set(live.columns) else live.iloc[:0]
+        common = prices.index.intersection(live.index)
+        if len(common):
+            anchor = common[0]
+            prices = pd.concat([live[live.index < anchor] * (prices.loc[anchor] / live.loc[anchor]), prices])
+        else:
+            extended = False
+    return prices, extended
+
+
+def _assemble_prices(tickers, start_date, end_date):
+    """
+    Daily closes for the tickers from the universe cache, extended and completed with
+    live data. Rows are not aligned yet: a ticker without a price on a date is NaN there.
+
+    Returns:
+        tuple: (prices, extended), extended being False if the cache could not be
+        extended to the window with live data.
+    """
+    universe = load_universe_prices()
+    cached = [t for t in tickers if t in universe.columns]
+    missing = [t for t in tickers if t not in universe.columns]
+
+    prices = slice_dates(universe, start_date, end_date)[cached]
+    extended = True
+    if cached and not _covers(universe.index, start_date, end_date):
+        prices, extended = _extend_to_window(prices, start_date, end_date)
+    if missing:
+        # Anything outside the S&P 500 cache is downloaded concurrently.
+        fetched = _fetch_live(missing, start_date, end_date)
+        if not fetched.empty:
+            prices = pd.concat([prices, fetched], axis=1, join='outer', sort=True) if cached else fetched
+    return prices, extended
+
+
+def window_from_panel(panel, tickers, end_date, frequency='daily'):
+    """
+    Builds the (prices, returns) window of get_price_window/get_return_window for
+    tickers from a get_price_panel frame: the dates where all of them have a price,
+    resampled to the frequency.
+
+    A weekly or monthly period only counts if it ends by end_date, as in the sliced
+    universe frames of the fast path. The trailing partial period is dropped, so its
+    last row is not the latest price; take that from the daily window.
+    """
+    available = [t for t in tickers if t in panel.columns]
+    prices = panel[available].dropna(axis='rows', how='any')
+    if prices.empty:
+        return pd.DataFrame(), pd.DataFrame()
+
+    prices = _resample(prices, frequency).dropna(how='any')
+    prices = prices[prices.index <= pd.Timestamp(end_date)]
+    returns = prices.pct_change().dropna()
+    return prices, returns
+
+
+def get_price_panel(tickers, start_date, end_date):
+    """
+    Daily closes for many tickers over [start_date, end_date] in one frame, for batch
+    callers that need a window per ticker subset (see window_from_panel). Rows are
+    not aligned across tickers, and nothing goes through the window cache, so a large
+    batch does not evict the interactive windows.
+    """
+    return _assemble_prices(list(tickers), start_date, end_date)[0]
+
+
+def _build_window(tickers, start_date, end_date, frequency):
+    """Returns ((prices, returns), cacheable); a window whose live extension failed is not cacheable."""
+    universe_prices, universe_returns = get_universe_frames(frequency)
+    cached = [t for t in tickers if t in universe_prices.columns]
+    missing = [t for t in tickers if t not in universe_prices.columns]
+
+    if not missing and cached and _covers(load_universe_prices().index, start_date, end_date):
+        # Fast path: both frames are slices of the pre-resampled universe, so no
+        # resampling or return computation happens per window.
+        index = universe_prices.index
+        lo = index.searchsorted(pd.Timestamp(start_date), side='left')
+        hi = index.searchsorted(pd.Timestamp(end_date), side='right')
+        prices = universe_prices.iloc[lo:hi][cached]
+        if len(prices) > 1 and prices.notna().all().all():
+            return (prices, universe_returns.iloc[lo + 1:hi][cached]), True
+
+    panel, extended = _assemble_prices(tickers, start_date, end_date)
+    return window_from_panel(panel, tickers, end_date, frequency), extended
+
+
+def _get_window(tickers, start_date, end_date, frequency):
+    key = (tuple(tickers), str(start_date), str(end_date), frequency)
+    with _window_cache_lock:
+        if key in _window_cache:
+            _window_cache.move_to_end(key)
+            return _window_cache[key]
+
+    # Built outside the lock, since a cache miss may wait on live downloads. A window
+    # whose live extension failed is not kept, so it is retried once the network is back.
+    window, cacheable = _build_window(list(tickers), start_date, end_date, frequency)
+    if cacheable and not window[0].empty:
+        with _window_cache_lock:
+            window = _window_cache.setdefault(key, window)
+            _window_cache.move_to_end(key)
+            if len(_window_cache) > MAX_CACHED_WINDOWS:
+                _window_cache.popitem(last=False)
+    return window
+
+
+def get_price_window(tickers, start_date, end_date, frequency='daily'):
+    """
+    Returns closing prices for the tickers over [start_date, end_date].
+
+    Args:
+        tickers (list): Ticker symbols, in the column order wanted back.
+        start_date (str): Inclusive start of the window ('YYYY-MM-DD').
+        end_date (str): Inclusive end of the window ('YYYY-MM-DD').
+        frequency (str): 'daily', 'weekly' or 'monthly'. Weekly and monthly windows
+            end with the last period that closes by end_date, so latest prices
+            should come from the daily window.
+
+    Returns:
+        pd.DataFrame: Prices for the tickers that have data. The frame is shared
+        with the window cache, so callers must treat it as read-only.
+    """
+    return _get_window(tickers, start_date, end_date, frequency)[0]
+
+
+def get_return_window(tickers, start_date, end_date, frequency='daily'):
+    """
+    Returns simple returns for the tickers over [start_date, end_date].
+
+    This is the cached equivalent of get_price_window(...).pct_change().dropna(),
+    so repeated analyses on the same window skip both the slicing and the
+    return computation. The frame is shared with the cache; treat it as read-only.
+    """
+    return _get_window(tickers, start_date, end_date, frequency)[1]
+
+
+def clear_window_cache():
+    """Drops every cached window (e.g. after the universe cache is rebuilt)."""
+    global _universe_prices
+    with _window_cache_lock:
+        _window_cache.clear()
+    _universe_by_frequency.clear()
+    _universe_prices = None
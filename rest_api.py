@@ -0,0 +1,388 @@
+# In rest_api.py
+
+import numpy as np
+import pandas as pd
+from flask import Blueprint, Response, jsonify, request
+from scipy.special import ndtri
+
+from price_store import FREQUENCY_RULES, get_lookback_window, get_price_panel, periods_per_year, window_from_panel
+from portfolio_optimizer import get_final_allocation
+from risk_calculator import calculate_monte_carlo_var_es, standard_normal_pdf
+from share_allocator import allocate_shares
+from stock_screener import screen_hedges, window_length
+
+ARROW_MIME_TYPE = 'application/vnd.apache.arrow.stream'
+
+# Upper bound on portfolios per request, to keep one call from monopolizing a worker.
+MAX_PORTFOLIOS = 1000
+
+PROFILES = ('min_risk', 'balanced', 'high_growth')
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+
+class ApiError(Exception):
+    """A problem with the request itself; reported to the client as HTTP 400."""
+
+
+@api.errorhandler(ApiError)
+def _handle_api_error(error):
+    return jsonify({'error': str(error)}), 400
+
+
+# --- Request parsing ---
+# Every field is checked (and numeric strings coerced) here, so a malformed request is
+# answered with a 400 naming the field instead of failing somewhere inside the analytics.
+def _number(source, key, default, valid=np.isfinite, requirement="a finite number", where=''):
+    value = source.get(key, default)
+    try:
+        if isinstance(value, bool):
+            raise TypeError
+        number = float(value)
+    except (TypeError, ValueError):
+        number = np.nan
+    if np.isnan(number) or not valid(number):
+        raise ApiError(f"{where}'{key}' must be {requirement}, got {value!r}.")
+    return number
+
+
+def _flag(source, key, default, where=''):
+    value = source.get(key, default)
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str) and value.strip().lower() in ('true', 'false', 'yes', 'no', '1', '0'):
+        return value.strip().lower() in ('true', 'yes', '1')
+    raise ApiError(f"{where}'{key}' must be true or false, got {value!r}.")
+
+
+def _date(source, key, default):
+    value = source.get(key, default)
+    try:
+        return pd.Timestamp(value).strftime('%Y-%m-%d')
+    except (TypeError, ValueError):
+        raise ApiError(f"'{key}' must be a date (YYYY-MM-DD), got {value!r}.")
+
+
+def _parse_portfolio(i, portfolio):
+    where = f"Portfolio {i}: "
+    if not isinstance(portfolio, dict) or not (portfolio.get('holdings') or portfolio.get('weights')):
+        raise ApiError(f"Portfolio {i} needs a 'holdings' (ticker -> shares) or 'weights' (ticker -> weight) object.")
+    portfolio['id'] = str(portfolio.get('id', i))
+    for key in ('holdings', 'weights'):
+        if key not in portfolio:
+            continue
+        amounts = portfolio[key]
+        if not isinstance(amounts, dict):
+            raise ApiError(f"{where}'{key}' must be an object mapping tickers to numbers.")
+        portfolio[key] = {ticker: _number(amounts, ticker, None, lambda x: 0 <= x < np.inf, "a non-negative number", f"{where}{key} ")
+                          for ticker in amounts}
+    if sum((portfolio.get('holdings') or portfolio.get('weights')).values()) <= 0:
+        raise ApiError(f"{where}at least one holding or weight must be positive.")
+
+    candidates = portfolio.get('candidates', [])
+    if not isinstance(candidates, list) or not all(isinstance(t, str) for t in candidates):
+        raise ApiError(f"{where}'candidates' must be a list of tickers.")
+    if portfolio.get('profile', 'balanced') not in PROFILES:
+        raise ApiError(f"{where}'profile' must be one of {list(PROFILES)}.")
+    portfolio['budget'] = _number(portfolio, 'budget', 0, lambda x: 0 <= x < np.inf, "a non-negative number", where)
+    portfolio['max_allocation'] = _number(portfolio, 'max_allocation', 0.35, lambda x: 0 < x <= 1, "between 0 and 1", where)
+    portfolio['sell_enabled'] = _flag(portfolio, 'sell_enabled', True, where)
+
+
+def _parse_request():
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        raise ApiError("Request body must be a JSON object.")
+    portfolios = body.get('portfolios')
+    if not isinstance(portfolios, list) or not portfolios:
+        raise ApiError("'portfolios' must be a non-empty list.")
+    if len(portfolios) > MAX_PORTFOLIOS:
+        raise ApiError(f"At most {MAX_PORTFOLIOS} portfolios are accepted per request.")
+    for i, portfolio in enumerate(portfolios):
+        _parse_portfolio(i, portfolio)
+    if len({p['id'] for p in portfolios}) != len(portfolios):
+        raise ApiError("Portfolio ids must be unique.")
+
+    if body.get('frequency', 'daily') not in FREQUENCY_RULES:
+        raise ApiError(f"'frequency' must be one of {list(FREQUENCY_RULES)}.")
+    body['confidence_level'] = _number(body, 'confidence_level', 0.99, lambda x: 0 < x < 1, "strictly between 0 and 1")
+    body['risk_free_rate'] = _number(body, 'risk_free_rate', 0.02)
+
+    years = _number(body, 'lookback_years', 2, lambda x: 0 < x <= 100, "a positive number of years")
+    start_date, end_date = get_lookback_window(years=years)
+    start_date, end_date = _date(body, 'start_date', start_date), _date(body, 'end_date', end_date)
+    if start_date >= end_date:
+        raise ApiError("'start_date' must be before 'end_date'.")
+    return body, portfolios, start_date, end_date
+
+
+def _all_tickers(portfolios, extra_key=None):
+    tickers = []
+    for portfolio in portfolios:
+        for ticker in list(portfolio.get('holdings') or portfolio.get('weights')) + list(portfolio.get(extra_key) or []):
+            if ticker not in tickers:
+                tickers.append(ticker)
+    return tickers
+
+
+def _weight_matrix(portfolios, latest_prices):
+    """
+    Builds a (portfolios x tickers) weight matrix. Holdings are valued at the latest
+    prices; tickers without price data are left out and reported per portfolio.
+    """
+    position = {t: i for i, t in enumerate(latest_prices.index)}
+    prices = latest_prices.values
+    weights = np.zeros((len(portfolios), len(position)))
+    missing = {}
+    for row, portfolio in enumerate(portfolios):
+        amounts = portfolio.get('holdings') or portfolio.get('weights')
+        missing[portfolio['id']] = ','.join(t for t in amounts if t not in position)
+        columns = [position[t] for t in amounts if t in position]
+        values = np.array([amounts[t] for t in amounts if t in position], dtype=float)
+        if portfolio.get('holdings'):
+            values = values * prices[columns]
+        if values.sum() > 0:
+            weights[row, columns] = values / values.sum()
+    return pd.DataFrame(weights, index=[p['id'] for p in portfolios], columns=latest_prices.index), pd.Series(missing)
+
+
+def _load_portfolios(portfolios, start_date, end_date, extra_key=None, frequency='daily'):
+    """
+    Loads the daily prices of every requested ticker once and builds one window per
+    set of gappy tickers (those missing some dates) that portfolios hold. A ticker
+    with a short history therefore only shortens the windows of the portfolios that
+    hold it, while the usual batch of fully priced portfolios shares a single window.
+
+    Returns:
+        list: (portfolios, latest daily prices, returns, weights, missing) for every
+        window with price data.
+    """
+    panel = get_price_panel(_all_tickers(portfolios, extra_key), start_date, end_date)
+    gappy = set(panel.columns[panel.isna().any()])
+    groups = {}
+    for portfolio in portfolios:
+        groups.setdefault(frozenset(gappy.intersection(_all_tickers([portfolio], extra_key))), []).append(portfolio)
+
+    loaded = []
+    for held_gappy, group in groups.items():
+        tickers = [t for t in panel.columns if t not in gappy or t in held_gappy]
+        daily_prices = panel[tickers].dropna(axis='rows', how='any')
+        if daily_prices.empty:
+            continue
+        _, returns = window_from_panel(panel, tickers, end_date, frequency)
+        weights, missing = _weight_matrix(group, daily_prices.iloc[-1])
+        loaded.append((group, daily_prices.iloc[-1], returns, weights, missing))
+    if not loaded:
+        raise ApiError("No price data is available for the requested tickers.")
+    return loaded
+
+
+def _window_columns(returns, count):
+    """The effective window a group's statistics were computed over, repeated for its count portfolios."""
+    start, end = (returns.index[0], returns.index[-1]) if len(returns) else (None, None)
+    return {'window_start': [None if start is None else start.strftime('%Y-%m-%d')] * count,
+            'window_end': [None if end is None else end.strftime('%Y-%m-%d')] * count,
+            'observations': [len(returns)] * count}
+
+
+def _collect(tables, portfolios, key='id'):
+    """Joins per-group tables back into request order; portfolios without any price data get empty rows."""
+    table = pd.concat(tables, ignore_index=True)
+    priced = set(table[key])
+    unpriced = [p for p in portfolios if p['id'] not in priced]
+    if unpriced:
+        table = pd.concat([table, pd.DataFrame({key: [p['id'] for p in unpriced], 'missing_tickers': [
+            ','.join(_all_tickers([p])) for p in unpriced]})], ignore_index=True)
+    order = {p['id']: i for i, p in enumerate(portfolios)}
+    return table.sort_values(key, key=lambda ids: ids.map(order), kind='stable').reset_index(drop=True)
+
+
+# --- Vectorized risk statistics for many portfolios at once ---
+def _historical_var_es(portfolio_returns, confidence_level):
+    var = -np.percentile(portfolio_returns, (1 - confidence_level) * 100, axis=0)
+    tail = portfolio_returns < -var
+    with np.errstate(invalid='ignore'):
+        es = -(portfolio_returns * tail).sum(axis=0) / tail.sum(axis=0)
+    return var, es
+
+
+def _parametric_var_es(portfolio_returns, confidence_level):
+    mu, sigma = portfolio_returns.mean(axis=0), portfolio_returns.std(axis=0)
+    z_score = ndtri(1 - confidence_level)
+    var = -(mu + sigma * z_score)
+    es = -(mu - sigma * standard_normal_pdf(z_score) / (1 - confidence_level))
+    return var, es
+
+
+# --- Response encoding ---
+def _respond(table):
+    """Sends a DataFrame as compact JSON (columns + rows) or, on request, as Arrow IPC."""
+    wants_arrow = request.args.get('format') == 'arrow' or \
+        request.accept_mimetypes.best_match(['application/json', ARROW_MIME_TYPE]) == ARROW_MIME_TYPE
+    if wants_arrow:
+        import pyarrow as pa
+        arrow_table = pa.Table.from_pandas(table, preserve_index=False)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, arrow_table.schema) as writer:
+            writer.write_table(arrow_table)
+        return Response(sink.getvalue().to_pybytes(), mimetype=ARROW_MIME_TYPE)
+    table = table.astype(object).where(table.notna(), None)
+    return jsonify({'columns': list(table.columns), 'data': table.values.tolist()})
+
+
+def _allocation_notes(diagnostics, profile, portfolio, capped):
+    """
+    Explains where the result departs from the request (a profile switch, a fallback,
+    or no-sell floors cut to the per-asset cap); /optimize reports it as the row's error.
+    """
+    notes = []
+    if diagnostics['fallback']:
+        dropped = " without the no-sell constraint" if not portfolio['sell_enabled'] else ""
+        notes.append(f"The '{profile}' optimization failed; the weights fall back to '{diagnostics['fallback']}'{dropped}.")
+    elif diagnostics['profile'] != profile:
+        notes.append(f"The optimizer used the '{diagnostics['profile']}' profile instead of '{profile}'.")
+    if capped and not portfolio['sell_enabled']:
+        notes.append(f"Holdings above max_allocation may be sold down to it: {', '.join(capped)}.")
+    return ' '.join(notes) or None
+
+
+# --- Endpoints ---
+@api.route('/analyze', methods=['POST'])
+def analyze():
+    """
+    Annualized return, volatility and historical VaR/ES for every portfolio. With
+    'frequency' set to 'weekly' or 'monthly', VaR/ES are per period at that frequency.
+    """
+    body, portfolios, start_date, end_date = _parse_request()
+    confidence_level = body['confidence_level']
+    frequency = body.get('frequency', 'daily')
+    annualization = periods_per_year(frequency)
+    tables = []
+    for _, _, returns, weights, missing in _load_portfolios(portfolios, start_date, end_date, frequency=frequency):
+        portfolio_returns = returns.values @ weights.values.T
+        mean_returns, cov_matrix = returns.mean().values, returns.cov().values
+        annual_return = weights.values @ mean_returns * annualization
+        annual_volatility = np.sqrt(np.einsum('pi,ij,pj->p', weights.values, cov_matrix, weights.values) * annualization)
+        hist_var, hist_es = _historical_var_es(portfolio_returns, confidence_level)
+        tables.append(pd.DataFrame({
+            'id': weights.index, 'annual_return': annual_return, 'annual_volatility': annual_volatility,
+            'historical_var': hist_var, 'historical_es': hist_es, 'missing_tickers': missing.values,
+            **_window_columns(returns, len(weights)),
+        }))
+    return _respond(_collect(tables, portfolios))
+
+
+@api.route('/var', methods=['POST'])
+def value_at_risk():
+    """
+    VaR and ES by the requested methods ('historical', 'parametric', 'monte_carlo'),
+    per period at the request's 'frequency'.
+    """
+    body, portfolios, start_date, end_date = _parse_request()
+    confidence_level = body['confidence_level']
+    methods = body.get('methods', ['historical', 'parametric'])
+    if not isinstance(methods, list) or not all(isinstance(m, str) for m in methods):
+        raise ApiError("'methods' must be a list of method names.")
+    unknown = set(methods) - {'historical', 'parametric', 'monte_carlo'}
+    if unknown:
+        raise ApiError(f"Unknown VaR methods: {sorted(unknown)}.")
+    frequency = body.get('frequency', 'daily')
+    tables = []
+    for _, _, returns, weights, missing in _load_portfolios(portfolios, start_date, end_date, frequency=frequency):
+        portfolio_returns = returns.values @ weights.values.T
+        table = pd.DataFrame({'id': weights.index})
+        if 'historical' in methods:
+            table['historical_var'], table['historical_es'] = _historical_var_es(portfolio_returns, confidence_level)
+        if 'parametric' in methods:
+            table['parametric_var'], table['parametric_es'] = _parametric_var_es(portfolio_returns, confidence_level)
+        if 'monte_carlo' in methods:
+            simulated = [calculate_monte_carlo_var_es(portfolio_returns[:, p], confidence_level) for p in range(len(weights))]
+            table['monte_carlo_var'], table['monte_carlo_es'] = zip(*simulated)
+        table['missing_tickers'] = missing.values
+        tables.append(table.assign(**_window_columns(returns, len(weights))))
+    return _respond(_collect(tables, portfolios))
+
+
+@api.route('/screen', methods=['POST'])
+def screen():
+    """Least-correlated S&P 500 stocks per portfolio and window."""
+    body, portfolios, start_date, end_date = _parse_request()
+    frequency = body.get('frequency', 'daily')
+    if frequency != 'daily':
+        # The screening windows are counted in trading days.
+        raise ApiError("'/screen' only supports daily returns.")
+    windows = body.get('windows', ['3m', '6m', '2y'])
+    if not isinstance(windows, list) or not windows:
+        raise ApiError("'windows' must be a non-empty list.")
+    try:
+        for window in windows:
+            window_length(window)
+    except ValueError as e:
+        raise ApiError(str(e))
+    top_n = int(_number(body, 'top_n', 5, lambda x: 1 <= x <= 500 and x == int(x), "a whole number between 1 and 500"))
+    tables = []
+    for _, _, returns, weights, _ in _load_portfolios(portfolios, start_date, end_date, frequency=frequency):
+        tables.append(screen_hedges(returns.dot(weights.T), windows=windows, top_n=top_n))
+    table = pd.concat(tables, ignore_index=True).rename(columns=str.lower).rename(columns={'portfolio': 'id'})
+    order = {p['id']: i for i, p in enumerate(portfolios)}
+    table = table.sort_values('id', key=lambda ids: ids.map(order), kind='stable').reset_index(drop=True)
+    table['window'] = table['window'].astype(str)
+    return _respond(table)
+
+
+@api.route('/optimize', methods=['POST'])
+def optimize():
+    """
+    Optimal target weights and share counts per portfolio. Each portfolio may list
+    extra 'candidates' and set 'budget', 'profile', 'sell_enabled' and 'max_allocation'.
+    """
+    body, portfolios, start_date, end_date = _parse_request()
+    risk_free_rate = body['risk_free_rate']
+    frequency = body.get('frequency', 'daily')
+    rows = {p['id']: [{'id': p['id'], 'ticker': None, 'error': "No price data is available for these tickers."}]
+            for p in portfolios}
+    for group, latest_prices, returns, _, _ in _load_portfolios(portfolios, start_date, end_date, extra_key='candidates',
+                                                                frequency=frequency):
+        window_columns = {key: values[0] for key, values in _window_columns(returns, 1).items()}
+        for portfolio in group:
+            holdings = portfolio.get('holdings') or {}
+            tickers = [t for t in _all_tickers([portfolio], 'candidates') if t in returns.columns]
+            if len(tickers) < 2:
+                rows[portfolio['id']] = [{'id': portfolio['id'], 'ticker': None,
+                                          'error': "At least two tickers with price data are needed."}]
+                continue
+            current_shares = pd.Series({t: holdings.get(t, 0) for t in tickers}, dtype=float)
+            current_values = current_shares * latest_prices[tickers]
+            current_total = current_values.sum()
+            current_weights = current_values / current_total if current_total > 0 else current_values * 0
+            if portfolio.get('weights') and not holdings:
+                current_weights = pd.Series(portfolio['weights'], dtype=float).reindex(tickers).fillna(0)
+            total_value = current_total + portfolio['budget']
+
+            # With selling disabled the holdings must keep their value, i.e. their current weight
+            # of the post-budget total, and no floor can exceed the per-asset cap.
+            invested_fraction = current_total / total_value if current_total > 0 else 1.0
+            floors = current_weights.values * invested_fraction
+            capped = [t for t, floor in zip(tickers, floors) if floor > portfolio['max_allocation'] + 1e-9]
+            floors = np.minimum(floors, portfolio['max_allocation'])
+
+            window = returns[tickers]
+            profile = portfolio.get('profile', 'balanced')
+            final_weights, diagnostics = get_final_allocation(
+                window.mean(), window.cov(), profile, risk_free_rate, floors, portfolio['max_allocation'],
+                portfolio['sell_enabled'], periods_per_year=periods_per_year(frequency), return_diagnostics=True)
+            note = _allocation_notes(diagnostics, profile, portfolio, capped)
+            shares, leftover_cash, realized = allocate_shares(final_weights, latest_prices[tickers], total_value)
+            rows[portfolio['id']] = [{'id': portfolio['id'], 'ticker': t, 'target_weight': weight,
+                                      'realized_weight': realized[t], 'current_shares': int(current_shares[t]),
+                                      'target_shares': int(shares[t]), 'leftover_cash': leftover_cash,
+                                      **window_columns, 'error': note}
+                                     for t, weight in zip(tickers, final_weights)]
+    return _respond(pd.DataFrame([row for p in portfolios for row in rows[p['id']]]))
+
+
+def register_api(server):
+    """Mounts the JSON/Arrow endpoints on the Dash app's Flask server."""
+    server.register_blueprint(api)
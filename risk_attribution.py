@@ -0,0 +1,94 @@
+# In risk_attribution.py
+
+import numpy as np
+import pandas as pd
+from scipy.special import ndtri
+
+from portfolio_optimizer import calculate_portfolio_performance
+from risk_calculator import standard_normal_pdf
+
+
+def calculate_risk_contributions(weights, returns, confidence_level=0.99, periods_per_year=252):
+    """
+    Breaks portfolio volatility, parametric VaR/ES and historical VaR/ES down by asset.
+
+    Everything comes from one covariance-vector product and one sort of the scenario
+    P&L, so attributing risk costs about as much as a single VaR calculation instead
+    of re-running the analysis once per asset removed. Component contributions add
+    up to the portfolio totals (annualized volatility as in calculate_portfolio_performance,
+    per-period VaR/ES with the same conventions as risk_calculator).
+
+    Each marginal column is the matching contribution per unit of weight, so it is
+    defined for zero-weight assets too (e.g. a candidate being considered).
+
+    Args:
+        weights (array-like): Portfolio weights, in the order of the returns columns.
+        returns (pd.DataFrame): Asset returns (one column per asset), daily by default.
+        confidence_level (float): VaR/ES confidence level.
+        periods_per_year (int): Return periods per year, used to annualize volatility.
+
+    Returns:
+        pd.DataFrame: One row per asset with marginal, component and percentage
+        contributions.
+    """
+    weights = np.asarray(weights, dtype=float)
+    scenarios = returns.values
+    num_obs = len(scenarios)
+    mean_returns = returns.mean()
+    cov_matrix = returns.cov()
+
+    # --- Volatility ---
+    _, portfolio_vol = calculate_portfolio_performance(weights, mean_returns, cov_matrix, periods_per_year)
+    cov_times_w = cov_matrix.values @ weights
+    period_vol = portfolio_vol / np.sqrt(periods_per_year)
+    marginal_vol = cov_times_w * periods_per_year / portfolio_vol if portfolio_vol > 0 else np.zeros_like(weights)
+    component_vol = weights * marginal_vol
+
+    # --- Parametric VaR / ES (population std, as in calculate_parametric_var_es) ---
+    population_scale = (num_obs - 1) / num_obs
+    sigma = period_vol * np.sqrt(population_scale)
+    marginal_sigma = cov_times_w * population_scale / sigma if sigma > 0 else np.zeros_like(weights)
+    z_score = ndtri(1 - confidence_level)
+    tail_density = standard_normal_pdf(z_score) / (1 - confidence_level)
+    marginal_param_var = -(mean_returns.values + z_score * marginal_sigma)
+    marginal_param_es = -(mean_returns.values - tail_density * marginal_sigma)
+    component_param_var = weights * marginal_param_var
+    component_param_es = weights * marginal_param_es
+
+    # --- Historical VaR / ES (one sort of the scenario P&L) ---
+    scenario_pnl = scenarios @ weights
+    order = np.argsort(scenario_pnl)
+    # Reproduce np.percentile's linear interpolation between the two bracketing scenarios.
+    position = (1 - confidence_level) * (num_obs - 1)
+    lower, upper = int(np.floor(position)), int(np.ceil(position))
+    fraction = position - lower
+    quantile_returns = (1 - fraction) * scenarios[order[lower]] + fraction * scenarios[order[upper]]
+    marginal_hist_var = -quantile_returns
+    component_hist_var = weights * marginal_hist_var
+    hist_var = component_hist_var.sum()
+    tail = scenario_pnl < -hist_var
+    marginal_hist_es = -scenarios[tail].mean(axis=0) if tail.any() else np.zeros_like(weights)
+    component_hist_es = weights * marginal_hist_es
+
+    def _percent(component):
+        total = component.sum()
+        return component / total if total != 0 else np.zeros_like(component)
+
+    return pd.DataFrame({
+        'Weight': weights,
+        'Marginal Volatility': marginal_vol,
+        'Volatility Contribution': component_vol,
+        'Volatility %': _percent(component_vol),
+        'Marginal Parametric VaR': marginal_param_var,
+        'Parametric VaR Contribution': component_param_var,
+        'Parametric VaR %': _percent(component_param_var),
+        'Marginal Parametric ES': marginal_param_es,
+        'Parametric ES Contribution': component_param_es,
+        'Parametric ES %': _percent(component_param_es),
+        'Marginal Historical VaR': marginal_hist_var,
+        'Historical VaR Contribution': component_hist_var,
+        'Historical VaR %': _percent(component_hist_var),
+        'Marginal Historical ES': marginal_hist_es,
+        'Historical ES Contribution': component_hist_es,
+        'Historical ES %': _percent(component_hist_es),
+    }, index=returns.columns)
@@ -15,7 +15,13 @@ Budget (we should change the weight with pieces of stocks) , minimum expected
 '''
 import pandas as pd
 import numpy as np
-from scipy.stats import norm
+# scipy.special's inverse normal CDF is the same routine norm.ppf uses, without the
+# ~1s import cost of scipy.stats on the app's startup path.
+from scipy.special import ndtri
+
+def standard_normal_pdf(x):
+    """Density of the standard normal distribution (same as scipy.stats.norm.pdf)."""
+    return np.exp(-0.5 * x ** 2) / np.sqrt(2 * np.pi)
 
 def calculate_portfolio_returns(price_data, weights):
     """
@@ -71,10 +77,10 @@ def calculate_parametric_var_es(returns, confidence_level=0.95):
     sigma = np.std(returns)
     
     # Calculate VaR using the inverse of the normal distribution's CDF (Z-score)
-    var = -(mu + sigma * norm.ppf(1 - confidence_level))
+    var = -(mu + sigma * ndtri(1 - confidence_level))
     
     # Calculate ES for a normal distribution
-    es = -(mu - sigma * (norm.pdf(norm.ppf(1 - confidence_level)) / (1 - confidence_level)))
+    es = -(mu - sigma * (standard_normal_pdf(ndtri(1 - confidence_level)) / (1 - confidence_level)))
 
     return var, es
 
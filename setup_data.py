@@ -12,7 +12,10 @@ from datetime import date, timedelta
 
 # We need to import the functions from our backend modules to use them
 from ticker_fetcher import get_sp500_tickers
-from data_feeder import get_stock_data
+from data_feeder import get_stock_data, get_stock_data_with_volumes
+from universe_stats import STATS_CACHE_FILE, build_universe_stats, save_universe_stats
+from stress_tester import (HISTORICAL_EPISODES, SCENARIO_CACHE_FILE, build_historical_scenarios, covered_episodes,
+                           save_historical_scenarios)
 
 def prepare_deployment_data():
     """
@@ -28,6 +31,9 @@ def prepare_deployment_data():
     # This will scrape Wikipedia and create 'sp500_tickers.csv'
     # It also returns the lookup DataFrame which we'll need next.
     _, sp500_lookup_df = get_sp500_tickers()
+    if sp500_lookup_df.empty:
+        print("ERROR: Could not scrape the S&P 500 list and no ticker cache exists. Aborting.")
+        return
     print("...Ticker list cache ('sp500_tickers.csv') is ready.")
 
     # --- 2. Prepare Price Data Cache (as a high-performance Parquet file) ---
@@ -39,8 +45,9 @@ def prepare_deployment_data():
     # Get the list of tickers from the DataFrame we just created
     sp500_list = sp500_lookup_df['Ticker'].tolist()
     
-    # Download all the price data using our resilient data_feeder
-    all_prices = get_stock_data(sp500_list, START_DATE, END_DATE)
+    # Download all the price data using our resilient data_feeder; the volumes for
+    # step 4 come from the same download.
+    all_prices, all_volumes = get_stock_data_with_volumes(sp500_list, START_DATE, END_DATE)
 
     if not all_prices.empty:
         # Save it to the fast .parquet format
@@ -51,8 +58,33 @@ def prepare_deployment_data():
         print("ERROR: Failed to download price data. Aborting.")
         return # Stop the script if data download fails
 
+    # --- 3. Prepare Historical Stress Scenario Cache ---
+    print("\nStep 3: Preparing historical stress scenario cache...")
+    # Episodes inside the price window come straight from it; older ones are downloaded
+    # separately, so stocks listed later only drop out of that episode.
+    in_window = covered_episodes(all_prices)
+    episode_frames = [build_historical_scenarios(all_prices, in_window)] if in_window else []
+    for name, (start, end) in HISTORICAL_EPISODES.items():
+        if name in in_window:
+            continue
+        episode_end = (pd.Timestamp(end) + timedelta(days=1)).strftime('%Y-%m-%d')
+        episode_prices = get_stock_data(sp500_list, start, episode_end)
+        if not episode_prices.empty:
+            episode_frames.append(build_historical_scenarios(episode_prices, {name: (start, end)}))
+    if episode_frames:
+        save_historical_scenarios(pd.concat(episode_frames))
+        print(f"...Scenario cache ('{SCENARIO_CACHE_FILE}') is ready.")
+    else:
+        print("WARNING: Could not build any stress episode. Only factor shocks will be available.")
+
+    # --- 4. Materialize Per-Stock Statistics ---
+    # Re-run nightly with `python universe_stats.py` once the price cache has been refreshed.
+    print("\nStep 4: Preparing per-stock statistics table...")
+    save_universe_stats(build_universe_stats(all_prices, all_volumes if not all_volumes.empty else None))
+    print(f"...Statistics cache ('{STATS_CACHE_FILE}') is ready.")
+
     print("\n--- Data preparation complete. ---")
-    print("You can now commit 'sp500_tickers.csv' and 'sp500_prices.parquet' to your GitHub repository.")
+    print(f"You can now commit 'sp500_tickers.csv', 'sp500_prices.parquet', '{SCENARIO_CACHE_FILE}' and '{STATS_CACHE_FILE}' to your GitHub repository.")
     print("Make sure you have also committed the updated versions of your other .py files.")
 
 
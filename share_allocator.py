@@ -0,0 +1,102 @@
+# In share_allocator.py
+
+import numpy as np
+import pandas as pd
+
+
+def _greedy_allocation(target_values, prices, total_value):
+    """
+    Floors every position, then spends the leftover cash one share at a time on the
+    asset whose purchase most reduces the squared dollar tracking error.
+    """
+    shares = np.floor(target_values / prices)
+    cash = total_value - np.dot(shares, prices)
+
+    # Buying one share of asset i changes its squared error by p_i^2 - 2 * p_i * d_i,
+    # where d_i is the remaining dollar shortfall. Each asset can improve at most once
+    # after flooring (d_i < p_i), so this loop runs at most len(prices) times.
+    for _ in range(len(prices)):
+        shortfall = target_values - shares * prices
+        improvement = 2 * prices * shortfall - prices ** 2
+        improvement[prices > cash + 1e-9] = -np.inf
+        best = np.argmax(improvement)
+        if improvement[best] <= 0:
+            break
+        shares[best] += 1
+        cash -= prices[best]
+
+    return shares
+
+
+def _mip_allocation(target_values, prices, total_value, time_limit):
+    """
+    Solves min sum |target_i - p_i * x_i| subject to the budget, with integer x,
+    as a small mixed-integer program. Returns None when the solver gives up.
+    """
+    from scipy.optimize import milp, LinearConstraint, Bounds
+
+    n = len(prices)
+    # Variables are [x_1..x_n, e_1..e_n]; e_i is the absolute dollar error of asset i.
+    cost = np.concatenate([np.zeros(n), np.ones(n)])
+    eye = np.eye(n)
+    diag_prices = np.diag(prices)
+    constraints = [
+        LinearConstraint(np.hstack([diag_prices, eye]), lb=target_values, ub=np.inf),
+        LinearConstraint(np.hstack([-diag_prices, eye]), lb=-target_values, ub=np.inf),
+        LinearConstraint(np.concatenate([prices, np.zeros(n)])[np.newaxis, :], lb=-np.inf, ub=total_value),
+    ]
+    integrality = np.concatenate([np.ones(n), np.zeros(n)])
+    upper = np.concatenate([np.floor(total_value / prices), np.full(n, np.inf)])
+    result = milp(cost, constraints=constraints, integrality=integrality,
+                  bounds=Bounds(np.zeros(2 * n), upper), options={'time_limit': time_limit})
+    if result.x is None:
+        return None
+    return np.round(result.x[:n])
+
+
+def allocate_shares(weights, latest_prices, total_value, method='greedy', time_limit=2.0):
+    """
+    Turns target weights into whole share counts for a given amount of capital.
+
+    Args:
+        weights (array-like): Target portfolio weights (summing to 1).
+        latest_prices (pd.Series or array-like): Latest price of each asset.
+        total_value (float): Total capital to allocate, in dollars.
+        method (str): 'greedy' (fast, vectorized) or 'mip' (exact L1 tracking error,
+            meant for small portfolios; falls back to 'greedy' if the solver fails).
+        time_limit (float): Seconds the 'mip' solver may spend.
+
+    Returns:
+        tuple: (shares, leftover_cash, realized_weights). shares and realized_weights
+        are pd.Series when latest_prices is a Series, otherwise np.arrays.
+    """
+    prices = np.asarray(latest_prices, dtype=float)
+    weights = np.asarray(weights, dtype=float)
+    if weights.shape != prices.shape:
+        raise ValueError("weights and latest_prices must have the same length.")
+    if not np.all(np.isfinite(prices)) or np.any(prices <= 0):
+        raise ValueError("latest_prices must be positive and finite.")
+
+    total_value = max(float(total_value), 0.0)
+    target_values = total_value * weights
+
+    shares = None
+    if method == 'mip':
+        shares = _mip_allocation(target_values, prices, total_value, time_limit)
+        if shares is None:
+            print("WARNING: Exact share allocation failed. Falling back to greedy rounding.")
+    elif method != 'greedy':
+        raise ValueError(f"Unknown allocation method '{method}'. Use 'greedy' or 'mip'.")
+    if shares is None:
+        shares = _greedy_allocation(target_values, prices, total_value)
+
+    dollar_values = shares * prices
+    invested = dollar_values.sum()
+    leftover_cash = total_value - invested
+    realized_weights = dollar_values / invested if invested > 0 else np.zeros_like(prices)
+
+    shares = shares.astype(int)
+    if isinstance(latest_prices, pd.Series):
+        shares = pd.Series(shares, index=latest_prices.index)
+        realized_weights = pd.Series(realized_weights, index=latest_prices.index)
+    return shares, float(leftover_cash), realized_weights
@@ -0,0 +1,35 @@
+# In startup_profiler.py
+
+import time
+from contextlib import contextmanager
+
+# Imported first by app.py, so this is (close to) the moment the app started loading.
+_PROCESS_START = time.perf_counter()
+
+STARTUP_TIMINGS = {}
+_startup_total = None
+
+
+@contextmanager
+def timed_phase(name):
+    """Records how long one startup phase takes, in seconds."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STARTUP_TIMINGS[name] = time.perf_counter() - start
+
+
+def finish_startup():
+    """Freezes the total startup time (call once, when the app is ready) and prints the breakdown."""
+    global _startup_total
+    _startup_total = time.perf_counter() - _PROCESS_START
+    print("--- Startup time breakdown ---")
+    for name, seconds in STARTUP_TIMINGS.items():
+        print(f"  {name:<28}{seconds:8.3f}s")
+    print(f"  {'total':<28}{_startup_total:8.3f}s")
+
+
+def get_startup_report():
+    """Returns the per-phase breakdown plus the total startup time, in seconds."""
+    return {'phases': dict(STARTUP_TIMINGS), 'total_seconds': _startup_total}
@@ -1,36 +1,138 @@
 # In stock_screener.py
 
+import numpy as np
 import pandas as pd
-from data_cacher import get_sp500_price_data
+from price_store import load_universe_prices
+from universe_stats import load_universe_stats
+
+# Trading-day lengths for the window labels accepted by screen_hedges.
+WINDOW_LENGTHS = {'1m': 21, '3m': 63, '6m': 126, '1y': 252, '2y': 504}
+
+
+def trailing_correlations(universe_returns, portfolio_returns, lengths):
+    """
+    Correlations of every universe column with every portfolio column over several
+    trailing windows (all ending on the last row), in a single pass over the data.
+
+    Sums and sums of squares come from prefix sums over the reversed rows; the
+    cross-products are accumulated block by block as the windows grow, so each
+    row enters exactly one (T_block x N)^T (T_block x P) matrix product.
+
+    Returns:
+        np.array: Shape (len(lengths), N, P).
+    """
+    num_rows = len(universe_returns)
+    for n in lengths:
+        if not 2 <= n <= num_rows:
+            raise ValueError(f"Window lengths must be between 2 and {num_rows} rows, got {n}.")
+
+    # Centering does not change a correlation but keeps the sums well conditioned.
+    x = universe_returns - universe_returns.mean(axis=0)
+    y = portfolio_returns - portfolio_returns.mean(axis=0)
+    x, y = x[::-1], y[::-1]
+
+    sum_x, sum_xx = np.cumsum(x, axis=0), np.cumsum(x * x, axis=0)
+    sum_y, sum_yy = np.cumsum(y, axis=0), np.cumsum(y * y, axis=0)
+
+    correlations = np.full((len(lengths), x.shape[1], y.shape[1]), np.nan)
+    cross = np.zeros((x.shape[1], y.shape[1]))
+    done = 0
+    for i in np.argsort(lengths):
+        n = lengths[i]
+        cross += x[done:n].T @ y[done:n]
+        done = n
+        sx, sxx = sum_x[n - 1][:, None], sum_xx[n - 1][:, None]
+        sy, syy = sum_y[n - 1][None, :], sum_yy[n - 1][None, :]
+        denominator = np.sqrt((n * sxx - sx ** 2) * (n * syy - sy ** 2))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            correlations[i] = (n * cross - sx * sy) / denominator
+    return correlations
+
+
+def _aligned_universe_returns(portfolio_returns):
+    universe_data = load_universe_prices()
+    if universe_data.empty:
+        print("Could not load S&P 500 price data from cache.")
+        return None, None
+    universe_returns = universe_data.pct_change()
+    combined = pd.concat([universe_returns, portfolio_returns], axis=1, join='inner', keys=['universe', 'portfolio'])
+    combined.dropna(inplace=True)
+    if combined.empty:
+        return None, None
+    return combined['universe'], combined['portfolio']
+
+
+def window_length(window):
+    """Trading days in a screening window: a WINDOW_LENGTHS label or a whole number of at least 2."""
+    if isinstance(window, str):
+        if window not in WINDOW_LENGTHS:
+            raise ValueError(f"Unknown window '{window}'. Use one of {list(WINDOW_LENGTHS)} or a number of trading days.")
+        return WINDOW_LENGTHS[window]
+    if isinstance(window, bool) or not isinstance(window, (int, np.integer)) or window < 2:
+        raise ValueError(f"A window length must be a whole number of at least 2 trading days, got {window!r}.")
+    return int(window)
+
+
+def screen_hedges(portfolio_returns, windows=('3m', '6m', '2y'), top_n=5):
+    """
+    Ranks the least-correlated S&P 500 stocks for many portfolios and windows at once.
+
+    Args:
+        portfolio_returns (pd.DataFrame or pd.Series): (T x P) daily returns, one column per portfolio.
+        windows (list): Window labels from WINDOW_LENGTHS or trailing lengths in trading days
+            (at least 2). Windows longer than the shared history are capped at its length.
+            Anything else raises ValueError.
+        top_n (int): Number of suggestions kept per portfolio and window.
+
+    Returns:
+        pd.DataFrame: Columns 'Portfolio', 'Window', 'Ticker', 'Correlation',
+        sorted by ascending correlation within each (Portfolio, Window).
+    """
+    requested = [window_length(w) for w in windows]
+    if isinstance(portfolio_returns, pd.Series):
+        portfolio_returns = portfolio_returns.to_frame(portfolio_returns.name or '__PORTFOLIO__')
+    columns = ['Portfolio', 'Window', 'Ticker', 'Correlation']
+    if portfolio_returns.empty:
+        return pd.DataFrame(columns=columns)
+
+    universe, portfolios = _aligned_universe_returns(portfolio_returns)
+    if universe is None or len(universe) < 2:
+        return pd.DataFrame(columns=columns)
+
+    lengths = [min(n, len(universe)) for n in requested]
+    correlations = trailing_correlations(universe.values, portfolios.values, lengths)
+
+    tickers = universe.columns.to_numpy()
+    records = []
+    for w, window in enumerate(windows):
+        for p, portfolio in enumerate(portfolios.columns):
+            corr = correlations[w, :, p]
+            order = np.argsort(np.where(np.isnan(corr), np.inf, corr))[:top_n]
+            order = order[~np.isnan(corr[order])]
+            records.extend((portfolio, window, tickers[j], corr[j]) for j in order)
+    return pd.DataFrame.from_records(records, columns=columns)
+
 
 def find_uncorrelated_stocks(current_portfolio_returns, top_n=5):
     """
     Finds S&P 500 stocks with the lowest correlation to a portfolio, using the cache.
     """
     print("\n--- Screening for hedging opportunities using cached S&P 500 data ---")
-    
+
     if current_portfolio_returns.empty:
         return pd.DataFrame()
 
-    universe_data = get_sp500_price_data()
-    if universe_data.empty:
-        print("Could not load S&P 500 price data from cache.")
+    universe, portfolio = _aligned_universe_returns(current_portfolio_returns.to_frame('__PORTFOLIO__'))
+    if universe is None:
         return pd.DataFrame()
 
-    universe_returns = universe_data.pct_change()
-
-    combined_returns = pd.concat([universe_returns, current_portfolio_returns.rename('__PORTFOLIO__')], axis=1, join='inner')
-    combined_returns.dropna(inplace=True)
+    correlations = trailing_correlations(universe.values, portfolio.values, [len(universe)])[0, :, 0]
+    correlations = pd.Series(correlations, index=universe.columns).dropna()
 
-    if combined_returns.empty:
-        return pd.DataFrame()
+    corr_df = pd.DataFrame({'Correlation': correlations}).sort_values(by='Correlation', ascending=True).head(top_n)
 
-    correlation_matrix = combined_returns.corr()
-    if '__PORTFOLIO__' not in correlation_matrix:
-        return pd.DataFrame()
-        
-    correlations = correlation_matrix['__PORTFOLIO__'].drop('__PORTFOLIO__', errors='ignore')
-    
-    corr_df = pd.DataFrame({'Correlation': correlations}).sort_values(by='Correlation', ascending=True)
-    
-    return corr_df.head(top_n)
\ No newline at end of file
+    # Per-stock figures come from the materialized statistics table, not the price matrix.
+    stats = load_universe_stats()
+    if not stats.empty:
+        corr_df = corr_df.join(stats[['12m Return', 'Volatility', 'Beta']])
+    return corr_df
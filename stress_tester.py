@@ -0,0 +1,126 @@
+# In stress_tester.py
+
+import os
+import numpy as np
+import pandas as pd
+
+from price_store import load_universe_prices
+from universe_stats import load_universe_stats
+
+SCENARIO_CACHE_FILE = 'sp500_scenarios.parquet'
+
+# Named historical episodes: (peak date, trough date) of the drawdown.
+HISTORICAL_EPISODES = {
+    '2020 COVID Crash': ('2020-02-19', '2020-03-23'),
+    '2022 Rate Shock': ('2022-01-03', '2022-10-12'),
+    '2023 Regional Bank Stress': ('2023-03-08', '2023-03-13'),
+    '2025 Tariff Shock': ('2025-04-02', '2025-04-08'),
+}
+
+# Hypothetical moves of the equal-weighted S&P 500 market factor.
+MARKET_SHOCKS = {
+    'Market -20%': -0.20,
+    'Market -10%': -0.10,
+    'Market +10%': 0.10,
+}
+
+_scenarios = None
+
+
+def build_historical_scenarios(prices, episodes=None):
+    """
+    Turns a price history covering the episodes into one row of total returns per episode.
+
+    Args:
+        prices (pd.DataFrame): Daily closing prices (dates x tickers).
+        episodes (dict): Scenario name -> (start_date, end_date). Defaults to HISTORICAL_EPISODES.
+
+    Returns:
+        pd.DataFrame: Scenarios x tickers. Tickers without prices over an episode are NaN.
+    """
+    episodes = episodes or HISTORICAL_EPISODES
+    prices = prices.sort_index()
+    rows = {}
+    for name, (start, end) in episodes.items():
+        window = prices.loc[start:end]
+        if len(window) < 2:
+            continue
+        rows[name] = window.iloc[-1] / window.iloc[0] - 1
+    return pd.DataFrame(rows).T.reindex(columns=prices.columns)
+
+
+def covered_episodes(prices, episodes=None):
+    """The episodes (default HISTORICAL_EPISODES) whose whole span lies inside the price history."""
+    episodes = episodes or HISTORICAL_EPISODES
+    if prices.empty:
+        return {}
+    first, last = prices.index.min(), prices.index.max()
+    return {name: (start, end) for name, (start, end) in episodes.items()
+            if first <= pd.Timestamp(start) and pd.Timestamp(end) <= last}
+
+
+def build_factor_scenarios(betas, shocks=None):
+    """
+    Maps hypothetical market moves onto every stock through its beta to the
+    equal-weighted universe (the 'Beta' column of universe_stats), giving one
+    scenario row per shock.
+    """
+    shocks = shocks or MARKET_SHOCKS
+    return pd.DataFrame(np.outer(list(shocks.values()), betas.values),
+                        index=list(shocks.keys()), columns=betas.index)
+
+
+def save_historical_scenarios(scenarios, cache_file=SCENARIO_CACHE_FILE):
+    """Writes the historical scenario matrix next to the price cache."""
+    scenarios.to_parquet(cache_file)
+
+
+def load_scenarios():
+    """
+    Loads every scenario once per process: the stored historical episodes plus the
+    market-factor shocks derived from the stock betas. Without a scenario cache, the
+    episodes inside the universe price cache are built from it instead.
+    """
+    global _scenarios
+    if _scenarios is None:
+        frames = []
+        if os.path.exists(SCENARIO_CACHE_FILE):
+            frames.append(pd.read_parquet(SCENARIO_CACHE_FILE))
+        else:
+            prices = load_universe_prices()
+            episodes = covered_episodes(prices)
+            print(f"Scenario cache '{SCENARIO_CACHE_FILE}' not found. "
+                  f"Building {len(episodes)} episode(s) from the price cache.")
+            if episodes:
+                frames.append(build_historical_scenarios(prices, episodes))
+        stats = load_universe_stats()
+        if not stats.empty:
+            frames.append(build_factor_scenarios(stats['Beta']))
+        _scenarios = pd.concat(frames) if frames else pd.DataFrame()
+    return _scenarios
+
+
+def run_stress_tests(portfolio_weights, scenarios=None):
+    """
+    Evaluates every scenario against every candidate weighting in one matrix product.
+
+    Args:
+        portfolio_weights (pd.DataFrame or pd.Series): Portfolios x tickers weights
+            (a Series is treated as a single portfolio).
+        scenarios (pd.DataFrame): Scenarios x tickers returns. Defaults to load_scenarios().
+
+    Returns:
+        pd.DataFrame: Scenarios x portfolios of portfolio returns. A ticker missing from
+        a scenario (e.g. not yet listed at the time) is given that scenario's median move.
+    """
+    if isinstance(portfolio_weights, pd.Series):
+        portfolio_weights = portfolio_weights.to_frame(portfolio_weights.name or 'Portfolio').T
+    if scenarios is None:
+        scenarios = load_scenarios()
+    if scenarios.empty or portfolio_weights.empty:
+        return pd.DataFrame()
+
+    shocks = scenarios.reindex(columns=portfolio_weights.columns)
+    shocks = shocks.T.fillna(scenarios.median(axis=1)).T
+    results = shocks.values @ portfolio_weights.fillna(0).values.T
+    return pd.DataFrame(results, index=scenarios.index, columns=portfolio_weights.index)
@@ -12,6 +12,12 @@ import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
 import os
+import asyncio
+import json
+import threading
+import time
+from unittest import mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 print(os.getcwd())
 # Import the functions we want to test
 from data_feeder import get_stock_data
@@ -21,6 +27,23 @@ from risk_calculator import (
     calculate_parametric_var_es,
     calculate_monte_carlo_var_es
 )
+from share_allocator import allocate_shares
+from backtester import RollingMoments, run_backtest
+from stock_screener import screen_hedges
+from risk_attribution import calculate_risk_contributions
+from stress_tester import build_historical_scenarios, run_stress_tests
+from price_fetcher import AsyncPriceFetcher
+import ticker_fetcher
+from flask import Flask
+from rest_api import register_api
+from universe_optimizer import build_factor_model, find_best_additions, get_universe_factor_model, optimize_over_universe
+from universe_stats import build_universe_stats
+from portfolio_optimizer import calculate_portfolio_performance, get_final_allocation
+from multistart_optimizer import optimize_risk_parity, risk_contributions
+from load_tester import callback_payload, summarize
+from whatif_session import WhatIfSession
+from price_store import (coverage_warning, get_price_panel, get_price_window, get_return_window, get_universe_frames,
+                         load_universe_prices, periods_per_year, slice_dates, window_from_panel)
 
 class TestRiskAnalysisBackend(unittest.TestCase):
 
@@ -108,6 +131,555 @@ class TestRiskAnalysisBackend(unittest.TestCase):
         print("...Success!")
 
 
+class TestPriceStore(unittest.TestCase):
+    """Runs against the committed sp500_prices.parquet cache, so no network is needed."""
+
+    START, END = '2024-06-01', '2025-06-01'
+
+    def test_window_slice_matches_mask(self):
+        prices = get_price_window(['MSFT', 'AAPL'], self.START, self.END)
+        self.assertListEqual(list(prices.columns), ['MSFT', 'AAPL'])
+        self.assertGreaterEqual(prices.index[0], pd.Timestamp(self.START))
+        self.assertLessEqual(prices.index[-1], pd.Timestamp(self.END))
+
+        frame = pd.DataFrame({'x': range(5)}, index=pd.date_range('2024-01-01', periods=5))
+        sliced = slice_dates(frame, '2024-01-02', '2024-01-04')
+        self.assertListEqual(list(sliced['x']), [1, 2, 3])
+
+    def test_returns_are_cached_per_window(self):
+        returns = get_return_window(['MSFT', 'AAPL'], self.START, self.END)
+        prices = get_price_window(['MSFT', 'AAPL'], self.START, self.END)
+        pd.testing.assert_frame_equal(returns, prices.pct_change().dropna())
+        self.assertIs(returns, get_return_window(['MSFT', 'AAPL'], self.START, self.END))
+
+    def test_weekly_frequency(self):
+        daily = get_price_window(['MSFT'], self.START, self.END)
+        weekly = get_price_window(['MSFT'], self.START, self.END, frequency='weekly')
+        self.assertLess(len(weekly), len(daily) / 4)
+        with self.assertRaises(ValueError):
+            get_price_window(['MSFT'], self.START, self.END, frequency='hourly')
+
+    def test_window_past_the_cache_is_extended_live(self):
+        cache_end = load_universe_prices().index[-1]
+        end = (cache_end + pd.Timedelta(days=60)).strftime('%Y-%m-%d')
+        live_dates = pd.bdate_range(cache_end - pd.Timedelta(days=7), end, name='Date')
+        # Live closes are on a different (rebased) level than the cache but move 1% a day.
+        live = pd.DataFrame({'MSFT': 2.0 * 1.01 ** np.arange(len(live_dates))}, index=live_dates)
+
+        with mock.patch('price_store._fetch_live', return_value=live):
+            prices = get_price_window(['MSFT'], '2025-01-02', end)
+        self.assertEqual(prices.index[-1], live_dates[-1])
+        self.assertAlmostEqual(prices['MSFT'].iloc[-1], live['MSFT'].iloc[-1])
+        self.assertIsNone(coverage_warning(prices, '2025-01-02', end))
+        after_splice = prices['MSFT'].pct_change().loc[cache_end + pd.Timedelta(days=1):]
+        np.testing.assert_allclose(after_splice.values, 0.01)
+
+        with mock.patch('price_store._fetch_live', return_value=pd.DataFrame()):
+            stale = get_price_window(['AAPL'], '2025-01-02', end)
+        self.assertEqual(stale.index[-1], cache_end)
+        self.assertIn('stale', coverage_warning(stale, '2025-01-02', end))
+
+        # The stale window was not cached, so it is extended once the live source is back.
+        with mock.patch('price_store._fetch_live', return_value=live.rename(columns={'MSFT': 'AAPL'})):
+            recovered = get_price_window(['AAPL'], '2025-01-02', end)
+        self.assertEqual(recovered.index[-1], live_dates[-1])
+
+    def test_monthly_returns_share_the_resampled_universe(self):
+        monthly = get_return_window(['MSFT', 'AAPL'], self.START, self.END, frequency='monthly')
+        universe_prices, _ = get_universe_frames('monthly')
+        self.assertIs(universe_prices, get_universe_frames('monthly')[0])
+        expected = slice_dates(universe_prices, self.START, self.END)[['MSFT', 'AAPL']].pct_change().dropna()
+        pd.testing.assert_frame_equal(monthly, expected)
+
+        weights = np.array([0.5, 0.5])
+        annual_return, annual_vol = calculate_portfolio_performance(
+            weights, monthly.mean(), monthly.cov(), periods_per_year('monthly'))
+        self.assertAlmostEqual(annual_return, monthly.mean().values @ weights * 12)
+        self.assertAlmostEqual(annual_vol, np.sqrt(weights @ monthly.cov().values @ weights * 12))
+
+    def test_partial_periods_match_on_both_paths(self):
+        panel = get_price_panel(['MSFT', 'AAPL'], '2024-06-01', '2025-06-18')
+        for frequency in ('weekly', 'monthly'):
+            fast = get_price_window(['MSFT', 'AAPL'], '2024-06-01', '2025-06-18', frequency)
+            slow, _ = window_from_panel(panel, ['MSFT', 'AAPL'], '2025-06-18', frequency)
+            pd.testing.assert_frame_equal(fast, slow, check_freq=False)
+        self.assertEqual(fast.index[-1], pd.Timestamp('2025-05-31'))
+
+
+class TestShareAllocator(unittest.TestCase):
+
+    def setUp(self):
+        self.weights = np.array([0.5, 0.3, 0.2])
+        self.prices = pd.Series([950.0, 310.0, 45.0], index=['AVGO', 'MSFT', 'KO'])
+        self.budget = 10000
+
+    def test_greedy_beats_floor(self):
+        shares, cash, realized = allocate_shares(self.weights, self.prices, self.budget)
+        floor_shares = np.floor(self.budget * self.weights / self.prices.values)
+        floor_cash = self.budget - np.dot(floor_shares, self.prices.values)
+        self.assertListEqual(list(shares.index), list(self.prices.index))
+        self.assertGreaterEqual(cash, 0)
+        self.assertLessEqual(cash, floor_cash)
+        self.assertAlmostEqual(cash, self.budget - np.dot(shares.values, self.prices.values))
+        self.assertAlmostEqual(realized.sum(), 1.0)
+
+    def test_mip_is_at_least_as_close_as_greedy(self):
+        def l1_error(shares):
+            return np.abs(self.budget * self.weights - shares * self.prices.values).sum()
+        greedy, _, _ = allocate_shares(self.weights, self.prices, self.budget)
+        exact, cash, _ = allocate_shares(self.weights, self.prices, self.budget, method='mip')
+        self.assertGreaterEqual(cash, -1e-6)
+        self.assertLessEqual(l1_error(exact.values), l1_error(greedy.values) + 1e-6)
+
+    def test_invalid_prices(self):
+        with self.assertRaises(ValueError):
+            allocate_shares(self.weights, [100.0, np.nan, 10.0], self.budget)
+
+
+class TestBacktester(unittest.TestCase):
+
+    def test_rolling_moments_match_full_recompute(self):
+        returns = np.random.default_rng(0).normal(0, 0.01, (300, 4))
+        moments = RollingMoments(returns, 0, 100)
+        moments.advance(121)
+        moments.advance(260)
+        mean, cov = moments.mean_cov()
+        np.testing.assert_allclose(mean, returns[160:260].mean(axis=0))
+        np.testing.assert_allclose(cov, np.cov(returns[160:260].T))
+
+    def test_backtest_on_cached_universe(self):
+        result = run_backtest(['AAPL', 'MSFT', 'JNJ', 'JPM', 'XOM'], 'min_risk', lookback=120)
+        np.testing.assert_allclose(result['weights'].sum(axis=1), 1.0)
+        self.assertLessEqual(result['drawdown'].max(), 0)
+        self.assertAlmostEqual(result['equity'].iloc[-1], (1 + result['returns']).prod())
+        self.assertEqual(len(result['turnover']), len(result['weights']))
+
+
+class TestHedgeScreening(unittest.TestCase):
+
+    def test_batch_screen_matches_pandas_corr(self):
+        universe_returns = get_return_window(['AAPL', 'MSFT', 'XOM', 'JNJ'], '2024-04-01', '2025-09-26')
+        portfolios = pd.DataFrame({'tech': universe_returns[['AAPL', 'MSFT']].mean(axis=1),
+                                   'defensive': universe_returns[['XOM', 'JNJ']].mean(axis=1)})
+        result = screen_hedges(portfolios, windows=['3m', 120], top_n=3)
+        self.assertEqual(len(result), 2 * 2 * 3)
+
+        top = result[(result['Portfolio'] == 'defensive') & (result['Window'] == 120)]
+        self.assertTrue(top['Correlation'].is_monotonic_increasing)
+        ticker = top['Ticker'].iloc[0]
+        expected = get_return_window([ticker], '2024-04-01', '2025-09-26')[ticker].iloc[-120:].corr(portfolios['defensive'].iloc[-120:])
+        self.assertAlmostEqual(top['Correlation'].iloc[0], expected)
+
+    def test_invalid_windows_are_rejected(self):
+        portfolio = get_return_window(['AAPL', 'MSFT'], '2024-04-01', '2025-09-26').mean(axis=1)
+        for window in (0, -5, 1, '5y', 2.5):
+            with self.assertRaises(ValueError):
+                screen_hedges(portfolio, windows=[window])
+
+
+class TestRiskAttribution(unittest.TestCase):
+
+    def test_components_add_up_to_totals(self):
+        returns = get_return_window(['AAPL', 'MSFT', 'XOM', 'JNJ'], '2024-04-01', '2025-09-26')
+        weights = np.array([0.4, 0.3, 0.2, 0.1])
+        portfolio_returns = returns.dot(weights)
+        contributions = calculate_risk_contributions(weights, returns, 0.99).sum()
+
+        hist_var, hist_es = calculate_historical_var_es(portfolio_returns, 0.99)
+        para_var, para_es = calculate_parametric_var_es(portfolio_returns, 0.99)
+        self.assertAlmostEqual(contributions['Historical VaR Contribution'], hist_var)
+        self.assertAlmostEqual(contributions['Historical ES Contribution'], hist_es)
+        self.assertAlmostEqual(contributions['Parametric VaR Contribution'], para_var)
+        self.assertAlmostEqual(contributions['Parametric ES Contribution'], para_es)
+        self.assertAlmostEqual(contributions['Volatility Contribution'], portfolio_returns.std() * np.sqrt(252))
+        self.assertAlmostEqual(contributions['Volatility %'], 1.0)
+
+    def test_marginals_are_contributions_per_unit_weight(self):
+        returns = get_return_window(['AAPL', 'MSFT', 'XOM', 'JNJ'], '2024-04-01', '2025-09-26')
+        weights = np.array([0.5, 0.3, 0.2, 0.0])
+        table = calculate_risk_contributions(weights, returns, 0.99)
+        held = weights > 0
+        for measure in ('Parametric VaR', 'Parametric ES', 'Historical VaR', 'Historical ES'):
+            np.testing.assert_allclose(table[f'Marginal {measure}'][held] * weights[held],
+                                       table[f'{measure} Contribution'][held])
+        # The unheld asset still gets a marginal: its return in the VaR scenario.
+        self.assertNotEqual(table['Marginal Historical VaR'].iloc[3], 0)
+
+
+class TestStressTester(unittest.TestCase):
+
+    def test_scenarios_times_weights(self):
+        prices = pd.DataFrame({'A': [100.0, 90.0, 80.0], 'B': [50.0, 55.0, 60.0], 'C': [np.nan, 10.0, 10.0]},
+                              index=pd.date_range('2020-02-19', periods=3))
+        scenarios = build_historical_scenarios(prices, {'Crash': ('2020-02-19', '2020-02-21')})
+        self.assertAlmostEqual(scenarios.loc['Crash', 'A'], -0.2)
+        self.assertAlmostEqual(scenarios.loc['Crash', 'B'], 0.2)
+
+        weights = pd.DataFrame({'A': [0.5, 1.0], 'B': [0.5, 0.0], 'C': [0.0, 0.0]}, index=['Mixed', 'AllA'])
+        results = run_stress_tests(weights, scenarios)
+        self.assertAlmostEqual(results.loc['Crash', 'Mixed'], 0.0)
+        self.assertAlmostEqual(results.loc['Crash', 'AllA'], -0.2)
+
+    def test_episodes_in_the_price_cache_are_built_without_a_scenario_cache(self):
+        import stress_tester
+        prices = load_universe_prices()
+        self.assertEqual(list(stress_tester.covered_episodes(prices)), ['2025 Tariff Shock'])
+        with mock.patch.object(stress_tester, 'SCENARIO_CACHE_FILE', 'no_such_file.parquet'), \
+                mock.patch.object(stress_tester, '_scenarios', None):
+            scenarios = stress_tester.load_scenarios()
+        self.assertIn('2025 Tariff Shock', scenarios.index)
+        expected = prices.loc['2025-04-08', 'AAPL'] / prices.loc['2025-04-02', 'AAPL'] - 1
+        self.assertAlmostEqual(scenarios.loc['2025 Tariff Shock', 'AAPL'], expected)
+
+
+class _ChartStandIn(BaseHTTPRequestHandler):
+    """Local stand-in for the Yahoo chart API: slow enough to overlap, FLAKY fails once, SLOW times out."""
+    hits = {}
+
+    def do_GET(self):
+        ticker = self.path.split('?')[0].rsplit('/', 1)[-1]
+        _ChartStandIn.hits[ticker] = _ChartStandIn.hits.get(ticker, 0) + 1
+        time.sleep(1.0 if ticker == 'SLOW' else 0.2)
+        if ticker == 'FLAKY' and _ChartStandIn.hits[ticker] == 1:
+            self.send_response(503)
+            self.end_headers()
+            return
+        timestamps = [int(pd.Timestamp(d).timestamp()) + 14 * 3600 for d in ['2024-01-02', '2024-01-03', '2024-01-04']]
+        payload = {'chart': {'result': [{'timestamp': timestamps, 'indicators': {
+            'quote': [{'close': [10.0, 11.0, 12.0]}], 'adjclose': [{'adjclose': [10.0, 11.0, 12.0]}]}}], 'error': None}}
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestAsyncPriceFetcher(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), _ChartStandIn)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_port}/chart/{{ticker}}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def _run(self, *requests, **fetcher_options):
+        async def scenario():
+            fetcher = AsyncPriceFetcher(base_url=self.base_url, backoff=0.01, **fetcher_options)
+            try:
+                return await asyncio.gather(*(fetcher.fetch_prices(t, '2024-01-01', '2024-01-05') for t in requests))
+            finally:
+                await fetcher.close()
+        _ChartStandIn.hits.clear()
+        return asyncio.run(scenario())
+
+    def test_concurrent_requests_share_one_download(self):
+        first, second = self._run(['AAA'], ['AAA', 'BBB'])
+        self.assertEqual(_ChartStandIn.hits, {'AAA': 1, 'BBB': 1})
+        self.assertListEqual(list(second.columns), ['AAA', 'BBB'])
+        self.assertListEqual(list(first['AAA']), [10.0, 11.0, 12.0])
+
+    def test_retries_and_timeouts(self):
+        (prices,) = self._run(['FLAKY', 'SLOW', 'AAA'], timeout=0.5, retries=1)
+        self.assertEqual(_ChartStandIn.hits['FLAKY'], 2)
+        self.assertListEqual(list(prices.columns), ['FLAKY', 'AAA'])
+
+
+class TestTickerFetcher(unittest.TestCase):
+
+    def test_failed_scrape_keeps_the_ticker_cache(self):
+        import tempfile
+        with tempfile.TemporaryDirectory() as folder:
+            cache_file = os.path.join(folder, 'sp500_tickers.csv')
+            pd.DataFrame({'Symbol': ['MSFT', 'KO'], 'Security': ['Microsoft', 'Coca-Cola']}).to_csv(cache_file, index=False)
+            with mock.patch.object(ticker_fetcher, 'TICKER_CACHE_FILE', cache_file), \
+                    mock.patch.object(ticker_fetcher, 'fetch_sp500_df', return_value=None):
+                tickers, _ = ticker_fetcher.get_sp500_tickers()
+            self.assertEqual(tickers, ['MSFT', 'KO'])
+            self.assertEqual(len(pd.read_csv(cache_file)), 2)
+
+
+class TestRestApi(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        server = Flask(__name__)
+        register_api(server)
+        cls.client = server.test_client()
+        cls.portfolios = [{'id': 'tech', 'holdings': {'AAPL': 10, 'MSFT': 5}},
+                          {'id': 'mixed', 'weights': {'AAPL': 0.5, 'XOM': 0.3, 'JNJ': 0.2}}]
+        cls.window = {'start_date': '2024-06-01', 'end_date': '2025-06-01'}
+
+    def test_batch_var_matches_single_portfolio_functions(self):
+        response = self.client.post('/api/v1/var', json={'portfolios': self.portfolios, **self.window})
+        self.assertEqual(response.status_code, 200)
+        rows = {row[0]: dict(zip(response.json['columns'], row)) for row in response.json['data']}
+
+        returns = get_return_window(['AAPL', 'XOM', 'JNJ'], self.window['start_date'], self.window['end_date'])
+        mixed_returns = returns.dot([0.5, 0.3, 0.2])
+        hist_var, hist_es = calculate_historical_var_es(mixed_returns, 0.99)
+        para_var, _ = calculate_parametric_var_es(mixed_returns, 0.99)
+        self.assertAlmostEqual(rows['mixed']['historical_var'], hist_var)
+        self.assertAlmostEqual(rows['mixed']['historical_es'], hist_es)
+        self.assertAlmostEqual(rows['mixed']['parametric_var'], para_var)
+
+    def test_arrow_response_and_bad_request(self):
+        response = self.client.post('/api/v1/screen?format=arrow', json={'portfolios': self.portfolios, 'windows': ['3m'], 'top_n': 2, **self.window})
+        self.assertEqual(response.mimetype, 'application/vnd.apache.arrow.stream')
+        import pyarrow as pa
+        table = pa.ipc.open_stream(response.data).read_all()
+        self.assertEqual(table.num_rows, 4)
+
+        response = self.client.post('/api/v1/analyze', json={'portfolios': []})
+        self.assertEqual(response.status_code, 400)
+
+    def test_short_history_only_shortens_its_own_portfolio(self):
+        dates = pd.bdate_range('2025-01-02', '2025-06-01', name='Date')
+        listing = pd.DataFrame({'NEWCO': 10 * 1.001 ** np.arange(len(dates))}, index=dates)
+        portfolios = [self.portfolios[0], {'id': 'ipo', 'weights': {'AAPL': 0.5, 'NEWCO': 0.5}}]
+        with mock.patch('price_store._fetch_live', return_value=listing):
+            response = self.client.post('/api/v1/analyze', json={'portfolios': portfolios, **self.window})
+        self.assertEqual(response.status_code, 200)
+        rows = {row[0]: dict(zip(response.json['columns'], row)) for row in response.json['data']}
+        self.assertEqual(list(rows), ['tech', 'ipo'])
+
+        tech_returns = get_return_window(['AAPL', 'MSFT'], self.window['start_date'], self.window['end_date'])
+        self.assertEqual(rows['tech']['observations'], len(tech_returns))
+        self.assertEqual(rows['tech']['window_start'], tech_returns.index[0].strftime('%Y-%m-%d'))
+        self.assertGreaterEqual(rows['ipo']['window_start'], '2025-01-02')
+        self.assertLess(rows['ipo']['observations'], rows['tech']['observations'])
+
+    def test_batches_bypass_the_window_cache(self):
+        import price_store
+        rng = np.random.default_rng(0)
+        universe = list(load_universe_prices().columns)
+        portfolios = [{'id': str(i), 'weights': {t: 1.0 for t in rng.choice(universe, 5, replace=False)}}
+                      for i in range(200)]
+        cached = list(price_store._window_cache)
+        response = self.client.post('/api/v1/var', json={'portfolios': portfolios, **self.window})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json['data']), 200)
+        self.assertEqual(list(price_store._window_cache), cached)
+
+    def test_frequency_applies_to_var_and_not_screen(self):
+        body = {'portfolios': [self.portfolios[1]], 'frequency': 'weekly', **self.window}
+        response = self.client.post('/api/v1/var', json=body)
+        self.assertEqual(response.status_code, 200)
+        row = dict(zip(response.json['columns'], response.json['data'][0]))
+        weekly = get_return_window(['AAPL', 'XOM', 'JNJ'], self.window['start_date'], self.window['end_date'], 'weekly')
+        hist_var, _ = calculate_historical_var_es(weekly.dot([0.5, 0.3, 0.2]), 0.99)
+        self.assertAlmostEqual(row['historical_var'], hist_var)
+        self.assertEqual(row['observations'], len(weekly))
+
+        response = self.client.post('/api/v1/screen', json=body)
+        self.assertEqual(response.status_code, 400)
+
+    def test_malformed_fields_are_bad_requests(self):
+        tech = self.portfolios[0]
+        bad_requests = [
+            {'portfolios': [{'holdings': {'AAPL': 'abc'}}]},
+            {'portfolios': [{'holdings': ['AAPL', 'MSFT']}]},
+            {'portfolios': [tech], 'confidence_level': 'x'},
+            {'portfolios': [tech], 'confidence_level': 1.5},
+            {'portfolios': [tech], 'start_date': 'garbage'},
+            {'portfolios': [dict(tech, sell_enabled='maybe')]},
+        ]
+        for body in bad_requests:
+            response = self.client.post('/api/v1/var', json=body)
+            self.assertEqual(response.status_code, 400, body)
+            self.assertIn('error', response.json)
+        response = self.client.post('/api/v1/screen', json={'portfolios': [tech], 'windows': ['5y'], **self.window})
+        self.assertEqual(response.status_code, 400)
+
+        # Numeric strings are coerced rather than rejected. The lookback is pinned inside the price cache.
+        with mock.patch('rest_api.get_lookback_window', return_value=(self.window['start_date'], self.window['end_date'])) as lookback:
+            response = self.client.post('/api/v1/var', json={'portfolios': [tech], 'lookback_years': '2', 'confidence_level': '0.95'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(lookback.call_args.kwargs['years'], 2.0)
+
+    def test_sell_enabled_string_false_keeps_holdings(self):
+        portfolio = {'id': 'tech', 'holdings': {'AAPL': 10, 'MSFT': 5}, 'candidates': ['KO', 'JNJ'],
+                     'profile': 'min_risk', 'sell_enabled': 'False', 'max_allocation': 0.9}
+        response = self.client.post('/api/v1/optimize', json={'portfolios': [portfolio], **self.window})
+        self.assertEqual(response.status_code, 200)
+        rows = {row['ticker']: row for row in (dict(zip(response.json['columns'], r)) for r in response.json['data'])}
+        self.assertGreaterEqual(rows['AAPL']['target_shares'], 10)
+        self.assertGreaterEqual(rows['MSFT']['target_shares'], 5)
+
+    def test_no_sell_with_budget_keeps_holdings_and_reports_capped_floors(self):
+        portfolio = {'id': 'p', 'holdings': {'AAPL': 10, 'MSFT': 5, 'XOM': 10}, 'candidates': ['KO', 'JNJ'],
+                     'budget': 20000, 'sell_enabled': False}
+        response = self.client.post('/api/v1/optimize', json={'portfolios': [portfolio], **self.window})
+        rows = [dict(zip(response.json['columns'], r)) for r in response.json['data']]
+        for row in rows:
+            self.assertGreaterEqual(row['target_shares'], row['current_shares'])
+            self.assertIsNone(row['error'])
+
+        # Without new cash AAPL and MSFT are above the cap, so the row says they may be sold.
+        portfolio['budget'] = 0
+        response = self.client.post('/api/v1/optimize', json={'portfolios': [portfolio], **self.window})
+        error = dict(zip(response.json['columns'], response.json['data'][0]))['error']
+        self.assertIn('AAPL, MSFT', error)
+
+
+class TestUniverseOptimizer(unittest.TestCase):
+
+    def test_factor_model_reproduces_variances(self):
+        returns = np.random.default_rng(1).normal(0, 0.01, (250, 30))
+        loadings, specific_variance = build_factor_model(returns, num_factors=3)
+        implied_cov = loadings @ loadings.T + np.diag(specific_variance)
+        np.testing.assert_allclose(np.diag(implied_cov), returns.var(axis=0, ddof=1))
+
+    def test_cardinality_and_holdings_kept(self):
+        holdings = pd.Series({'AAPL': 0.5, 'MSFT': 0.3, 'NVDA': 0.2})
+        result = find_best_additions(holdings, num_new_stocks=4, time_budget=5.0)
+        self.assertEqual(len(result['selected']), 4)
+        self.assertTrue(set(result['selected']).isdisjoint(holdings.index))
+        self.assertListEqual(result['tickers'][:3], list(holdings.index))
+        self.assertLess(result['seconds'], 5.0)
+
+    def test_factor_model_cache_is_bounded(self):
+        import universe_optimizer
+        for day in range(universe_optimizer.MAX_FACTOR_MODELS + 2):
+            get_universe_factor_model('2024-06-01', f'2025-06-{day + 1:02d}', num_factors=2)
+        self.assertEqual(len(universe_optimizer._factor_models), universe_optimizer.MAX_FACTOR_MODELS)
+        self.assertIn(('2024-06-01', f'2025-06-{universe_optimizer.MAX_FACTOR_MODELS + 2:02d}', 2),
+                      universe_optimizer._factor_models)
+
+    def test_no_sell_floors_leave_room_for_the_budget(self):
+        holdings = pd.Series({'AAPL': 0.5, 'MSFT': 0.3, 'NVDA': 0.2})
+        # Doubling the portfolio with new cash halves what the kept holdings must weigh.
+        weights, selection = optimize_over_universe(holdings, 'min_risk', num_new_stocks=4, max_allocation=0.6,
+                                                    sell_enabled=False, current_value=10000, budget=10000)
+        np.testing.assert_array_less(holdings.values / 2 - 1e-6, weights[holdings.index].values)
+        self.assertGreater(weights[selection['selected']].sum(), 0.05)
+
+
+class TestMultiStartRiskParity(unittest.TestCase):
+
+    def setUp(self):
+        self.returns = get_return_window(['MSFT', 'AAPL', 'NVDA', 'KO', 'XOM', 'JPM'], '2024-06-01', '2025-06-01')
+
+    def test_pool_finds_equal_risk_contributions(self):
+        # Pretend to have two CPUs so the shared-memory pool path runs even on a one-core host.
+        with mock.patch('multistart_optimizer.os.cpu_count', return_value=2):
+            result = optimize_risk_parity(self.returns.cov().values, 0.5, num_starts=4, max_workers=2)
+        self.assertTrue(result['feasible'])
+        self.assertAlmostEqual(result['weights'].sum(), 1.0)
+        self.assertLessEqual(result['weights'].max(), 0.5 + 1e-8)
+        contributions = risk_contributions(result['weights'], self.returns.cov().values)
+        self.assertLess(np.std(contributions) / contributions.mean(), 1e-3)
+        self.assertTrue(all('message' in start for start in result['starts']))
+
+    def test_single_start_moves_off_equal_weights(self):
+        weights = get_final_allocation(self.returns.mean(), self.returns.cov(), 'balanced', -1.0, np.zeros(6), 0.5, True)
+        self.assertFalse(np.allclose(weights, 1 / 6))
+        contributions = risk_contributions(weights, self.returns.cov().values)
+        self.assertLess(np.std(contributions) / contributions.mean(), 1e-2)
+
+    def test_allocation_reports_the_profile_it_used(self):
+        weights, diagnostics = get_final_allocation(
+            self.returns.mean(), self.returns.cov(), 'balanced', -1.0, np.zeros(6), 0.5, True,
+            num_starts=4, max_workers=1, return_diagnostics=True)
+        self.assertEqual(diagnostics['profile'], 'balanced')
+        self.assertIsNone(diagnostics['fallback'])
+        self.assertTrue(diagnostics['multistart']['stopped_early'])
+        np.testing.assert_allclose(weights, diagnostics['multistart']['weights'], atol=1e-6)
+
+
+class TestLoadTester(unittest.TestCase):
+
+    def test_callback_payload_matches_dash_protocol(self):
+        dependency = {'output': '..results-output.children...store.data..',
+                      'inputs': [{'id': 'go', 'property': 'n_clicks'}],
+                      'state': [{'id': 'store', 'property': 'data'}]}
+        payload = callback_payload(dependency, {'go': 1}, {'store': {'data': {'AAPL': 3}}})
+        self.assertEqual(payload['outputs'], [{'id': 'results-output', 'property': 'children'},
+                                              {'id': 'store', 'property': 'data'}])
+        self.assertEqual(payload['state'][0]['value'], {'AAPL': 3})
+        self.assertEqual(payload['changedPropIds'], ['go.n_clicks'])
+
+        single = callback_payload({'output': 'results-output.children@abc', 'inputs': dependency['inputs'], 'state': []},
+                                  {'go': 2}, {})
+        self.assertEqual(single['outputs'], {'id': 'results-output', 'property': 'children@abc'})
+
+    def test_summary_percentiles(self):
+        timings = [('analyze', s / 1000, True) for s in range(1, 101)] + [('optimize', 0.5, False)]
+        table = summarize(timings, seconds=10.0).set_index('callback')
+        self.assertAlmostEqual(table.loc['analyze', 'p50_ms'], 50.5)
+        self.assertEqual(table.loc['optimize', 'errors'], 1)
+        self.assertEqual(table.loc['all', 'requests'], 101)
+        self.assertAlmostEqual(table.loc['all', 'throughput_rps'], 10.1)
+
+
+class TestWhatIfSession(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = get_return_window(['MSFT', 'AAPL', 'NVDA', 'KO', 'XOM', 'JPM', 'PG', 'TSLA'], '2024-06-01', '2025-06-01')
+
+    def test_updates_match_a_full_recompute(self):
+        session = WhatIfSession(self.pool, ['MSFT', 'AAPL', 'KO'])
+        for selection in (['MSFT', 'AAPL', 'KO', 'XOM', 'JPM'], ['AAPL', 'XOM', 'JPM', 'TSLA'], list(self.pool.columns)):
+            session.select(selection)
+            self.assertCountEqual(session.tickers, selection)
+            expected = self.pool[session.tickers].cov().values
+            np.testing.assert_allclose(session.cov, expected, atol=1e-14)
+            np.testing.assert_allclose(session.factor @ session.factor.T, expected, atol=1e-14)
+            np.testing.assert_allclose(session.factor, np.tril(session.factor))
+
+    def test_resolve_is_warm_started(self):
+        session = WhatIfSession(self.pool, ['MSFT', 'AAPL', 'KO'])
+        current = pd.Series({'MSFT': 0.5, 'AAPL': 0.3, 'KO': 0.2})
+        first = session.solve('min_risk', 0.02, current, 0.5, True)
+        self.assertAlmostEqual(first.sum(), 1.0)
+
+        session.add(['XOM'])
+        self.assertAlmostEqual(session.weights['XOM'], 0.25)
+        np.testing.assert_allclose(session.weights[first.index], first * 0.75)
+        second = session.solve('min_risk', 0.02, current, 0.5, True)
+        self.assertListEqual(list(second.index), ['MSFT', 'AAPL', 'KO', 'XOM'])
+        self.assertAlmostEqual(session.volatility(second.values),
+                               calculate_portfolio_performance(second.values, self.pool[second.index].mean(),
+                                                               self.pool[second.index].cov())[1])
+
+    def test_factor_solve_matches_get_final_allocation(self):
+        tickers = list(self.pool.columns)
+        session = WhatIfSession(self.pool, tickers)
+        current = pd.Series(0.5 / len(tickers), index=tickers)
+        for profile in ('min_risk', 'balanced', 'high_growth'):
+            for sell_enabled in (True, False):
+                session.weights = None
+                weights = session.solve(profile, 0.02, current, 0.35, sell_enabled)
+                expected = get_final_allocation(self.pool.mean(), self.pool.cov(), profile, 0.02, current.values, 0.35,
+                                                sell_enabled, num_starts=2, max_workers=1)
+                self.assertAlmostEqual(weights.sum(), 1.0)
+                self.assertTrue(np.all(weights.values <= 0.35 + 1e-8))
+                if not sell_enabled:
+                    self.assertTrue(np.all(weights.values >= current.values - 1e-8))
+                # Same problem, so the same optimum up to solver tolerance.
+                self.assertAlmostEqual(session.volatility(weights.values), session.volatility(expected), places=4)
+
+
+class TestUniverseStats(unittest.TestCase):
+
+    def test_statistics_table(self):
+        dates = pd.bdate_range('2024-01-01', periods=300)
+        prices = pd.DataFrame({'UP': np.linspace(100, 200, 300), 'FLAT': np.full(300, 50.0)}, index=dates)
+        volumes = pd.DataFrame({'UP': np.full(300, 1000.0), 'FLAT': np.full(300, 10.0)}, index=dates)
+        stats = build_universe_stats(prices, volumes)
+        self.assertAlmostEqual(stats.loc['UP', '12m Return'], 200 / prices['UP'].iloc[-253] - 1)
+        self.assertAlmostEqual(stats.loc['FLAT', 'Volatility'], 0.0)
+        self.assertAlmostEqual(stats.loc['UP', 'Max Drawdown'], 0.0)
+        self.assertAlmostEqual(stats.loc['FLAT', 'Avg Dollar Volume (3m)'], 500.0)
+
+
 # This allows you to run the tests by executing the script directly
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
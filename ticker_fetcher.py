@@ -1,17 +1,30 @@
 # In ticker_fetcher.py
+import os
 import pandas as pd
-import requests
+
+TICKER_CACHE_FILE = 'sp500_tickers.csv'
+
+_http_session = None
+
+def get_http_session():
+    """Returns a shared requests.Session, so repeated scrapes reuse one keep-alive connection."""
+    global _http_session
+    if _http_session is None:
+        # requests is only needed when scraping, so keep it off the app's startup path.
+        import requests
+        _http_session = requests.Session()
+        _http_session.headers.update({'User-Agent': 'Mozilla/5.0'})
+    return _http_session
 
 def fetch_sp500_df():
     """
     Scrapes Wikipedia for the list of S&P 500 companies.
-    This is ONLY for the setup script.
+    This is ONLY for the setup script. Returns None if the scrape fails.
     """
     print("Scraping fresh S&P 500 ticker list from Wikipedia...")
     try:
         wiki_url = 'https://en.wikipedia.org/wiki/List_of_S%26P_500_companies'
-        headers = {'User-Agent': 'Mozilla/5.0'}
-        response = requests.get(wiki_url, headers=headers)
+        response = get_http_session().get(wiki_url, timeout=30)
         response.raise_for_status()
         from io import StringIO
         sp500_table = pd.read_html(StringIO(response.text))[0]
@@ -21,4 +34,36 @@ def fetch_sp500_df():
         return df
     except Exception as e:
         print(f"An error occurred while scraping S&P 500 tickers: {e}")
-        return pd.DataFrame([{'Symbol': 'AAPL', 'Security': 'Apple Inc.'}])
\ No newline at end of file
+        return None
+
+def get_sp500_tickers():
+    """
+    Scrapes the S&P 500 list and saves it to the local ticker cache.
+    Returns the list of tickers and a lookup DataFrame ('Ticker', 'Company Name').
+    If the scrape fails, the existing cache is left untouched and returned instead
+    (both empty when there is no cache).
+    """
+    df = fetch_sp500_df()
+    if df is not None:
+        df.to_csv(TICKER_CACHE_FILE, index=False)
+    elif os.path.exists(TICKER_CACHE_FILE):
+        print(f"Keeping the existing ticker cache '{TICKER_CACHE_FILE}'.")
+        df = pd.read_csv(TICKER_CACHE_FILE)
+    else:
+        df = pd.DataFrame(columns=['Symbol', 'Security'])
+    lookup_df = df.rename(columns={'Symbol': 'Ticker', 'Security': 'Company Name'})
+    return lookup_df['Ticker'].tolist(), lookup_df
+
+def load_sp500_df():
+    """
+    Loads the S&P 500 list from the local ticker cache, scraping only when it is missing.
+    This is what the app uses on startup.
+    """
+    if os.path.exists(TICKER_CACHE_FILE):
+        return pd.read_csv(TICKER_CACHE_FILE)
+    print(f"Ticker cache '{TICKER_CACHE_FILE}' not found.")
+    df = fetch_sp500_df()
+    if df is None:
+        # Keep the app usable offline; this stand-in is never written to the cache.
+        return pd.DataFrame([{'Symbol': 'AAPL', 'Security': 'Apple Inc.'}])
+    return df
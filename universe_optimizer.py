@@ -0,0 +1,192 @@
+# In universe_optimizer.py
+
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import minimize
+
+from portfolio_optimizer import get_final_allocation
+from price_store import load_universe_prices, slice_dates
+from stock_screener import trailing_correlations
+
+# How many fitted universe models (one per window) each process keeps. Each holds a
+# universe-sized returns frame, and the lookback window moves every day.
+MAX_FACTOR_MODELS = 4
+
+_factor_models = OrderedDict()
+_factor_models_lock = threading.Lock()
+
+
+def build_factor_model(returns, num_factors=5):
+    """
+    Fits a statistical (PCA) factor model to a returns matrix so that
+    cov ~= loadings @ loadings.T + diag(specific_variance).
+
+    Returns:
+        tuple: (loadings (N x k) np.array, specific_variance (N,) np.array)
+    """
+    centered = returns - returns.mean(axis=0)
+    _, singular_values, components = np.linalg.svd(centered, full_matrices=False)
+    loadings = components[:num_factors].T * singular_values[:num_factors] / np.sqrt(len(returns) - 1)
+    total_variance = centered.var(axis=0, ddof=1)
+    specific_variance = np.maximum(total_variance - (loadings ** 2).sum(axis=1), 1e-10)
+    return loadings, specific_variance
+
+
+def get_universe_factor_model(start_date=None, end_date=None, num_factors=5):
+    """Returns (returns, mean returns, loadings, specific variance) for the cached universe, fitted once per window."""
+    key = (start_date, end_date, num_factors)
+    with _factor_models_lock:
+        if key in _factor_models:
+            _factor_models.move_to_end(key)
+            return _factor_models[key]
+
+    prices = load_universe_prices()
+    if start_date or end_date:
+        prices = slice_dates(prices, start_date or prices.index[0], end_date or prices.index[-1])
+    returns = prices.pct_change().dropna()
+    loadings, specific_variance = build_factor_model(returns.values, num_factors)
+    model = (returns, returns.mean().values, loadings, specific_variance)
+    with _factor_models_lock:
+        model = _factor_models.setdefault(key, model)
+        if len(_factor_models) > MAX_FACTOR_MODELS:
+            _factor_models.popitem(last=False)
+    return model
+
+
+def _min_variance_weights(loadings, specific_variance, lower, upper, start=None):
+    """
+    Minimum-variance weights under the factor covariance, with analytic gradients so
+    SLSQP stays fast on a few hundred variables.
+    """
+    def variance(w):
+        exposure = loadings.T @ w
+        return exposure @ exposure + specific_variance @ (w * w)
+
+    def gradient(w):
+        return 2 * (loadings @ (loadings.T @ w) + specific_variance * w)
+
+    n = len(specific_variance)
+    start = np.full(n, 1.0 / n) if start is None else start
+    result = minimize(variance, np.clip(start, lower, upper), jac=gradient, method='SLSQP',
+                      bounds=list(zip(lower, upper)),
+                      constraints=[{'type': 'eq', 'fun': lambda w: w.sum() - 1, 'jac': lambda w: np.ones_like(w)}])
+    return result.x, variance(result.x)
+
+
+def _invested_fraction(current_value, budget):
+    """Share of the post-budget portfolio the current holdings make up (their no-sell floors scale by it)."""
+    if not budget or current_value is None:
+        return 1.0
+    return current_value / (current_value + budget) if current_value + budget > 0 else 1.0
+
+
+def find_best_additions(holding_weights, num_new_stocks=5, max_allocation=0.35, sell_enabled=True,
+                        max_candidates=80, num_factors=5, start_date=None, end_date=None, time_budget=2.0,
+                        current_value=None, budget=0):
+    """
+    Picks the num_new_stocks S&P 500 names that best complement the current holdings.
+
+    The universe is first cut down to max_candidates names with low correlation to
+    the portfolio and low volatility (a stock_screener-style pre-filter). A
+    minimum-variance problem over holdings + candidates is then solved on the
+    factor covariance. The largest new weights define the initial selection, and
+    pairwise swaps improve it until no swap helps or the time budget runs out.
+
+    Args:
+        holding_weights (pd.Series): Current weights by ticker (these are always kept).
+        num_new_stocks (int): Cardinality limit on names added from the universe.
+        max_allocation (float): Per-asset weight cap.
+        sell_enabled (bool): If False, holdings keep at least their current weight of the
+            new total (current_value + budget).
+        max_candidates (int): Size of the pre-filtered candidate pool.
+        num_factors (int): Number of statistical factors in the covariance model.
+        start_date, end_date (str): Optional window of the universe cache to use.
+        time_budget (float): Seconds the swap search may spend.
+        current_value (float): Current portfolio value (only needed when budget > 0).
+        budget (float): New cash to invest alongside the holdings.
+
+    Returns:
+        dict: 'selected' (new tickers), 'tickers' (holdings + selected), 'variance'
+        (daily portfolio variance under the factor model) and 'seconds'.
+    """
+    started = time.perf_counter()
+    returns, _, loadings, specific_variance = get_universe_factor_model(start_date, end_date, num_factors)
+    universe = list(returns.columns)
+    holding_weights = holding_weights[holding_weights.index.isin(universe)]
+    held = [universe.index(t) for t in holding_weights.index]
+    floors = np.minimum(holding_weights.values * _invested_fraction(current_value, budget), max_allocation)
+
+    # --- Pre-filter: low correlation to the portfolio and low volatility ---
+    portfolio_returns = returns.values[:, held] @ holding_weights.values if held else returns.values.mean(axis=1)
+    correlation = trailing_correlations(returns.values, portfolio_returns[:, None], [len(returns)])[0, :, 0]
+    volatility = np.sqrt((loadings ** 2).sum(axis=1) + specific_variance)
+    score = pd.Series(correlation).rank(pct=True).values + pd.Series(volatility).rank(pct=True).values
+    score[held] = np.inf
+    pool = [i for i in np.argsort(score) if i not in held][:max_candidates]
+
+    def solve(new_names, start=None):
+        index = held + list(new_names)
+        lower = np.zeros(len(index))
+        if not sell_enabled and held:
+            lower[:len(held)] = floors
+        upper = np.full(len(index), max_allocation)
+        if upper.sum() < 1:
+            upper[:] = 1.0
+        return _min_variance_weights(loadings[index], specific_variance[index], lower, upper, start)
+
+    # --- Relaxation over the whole pool, then keep the biggest new weights ---
+    relaxed, _ = solve(pool)
+    new_weights = relaxed[len(held):]
+    selected = [pool[i] for i in np.argsort(-new_weights)[:num_new_stocks]]
+    weights, best_variance = solve(selected)
+
+    # --- Swap search: replace the weakest new name with the most promising outsider ---
+    outsiders = [i for i in pool if i not in selected]
+    improved = True
+    while improved and outsiders and time.perf_counter() - started < time_budget:
+        improved = False
+        full = np.zeros(len(specific_variance))
+        full[held + selected] = weights
+        marginal = loadings @ (loadings.T @ full) + specific_variance * full
+        weakest = int(np.argmin(weights[len(held):]))
+        for candidate in sorted(outsiders, key=lambda i: marginal[i])[:5]:
+            trial = selected[:weakest] + [candidate] + selected[weakest + 1:]
+            trial_weights, trial_variance = solve(trial)
+            if trial_variance < best_variance * (1 - 1e-6):
+                outsiders.remove(candidate)
+                outsiders.append(selected[weakest])
+                selected, weights, best_variance = trial, trial_weights, trial_variance
+                improved = True
+                break
+
+    new_tickers = [universe[i] for i in selected]
+    return {
+        'selected': new_tickers,
+        'tickers': list(holding_weights.index) + new_tickers,
+        'variance': float(best_variance),
+        'seconds': time.perf_counter() - started,
+    }
+
+
+def optimize_over_universe(holding_weights, target_profile, num_new_stocks=5, risk_free_rate=0.02,
+                           max_allocation=0.35, sell_enabled=True, current_value=None, budget=0, **selection_options):
+    """
+    Best (holdings + num_new_stocks) portfolio from the whole S&P 500 for a risk profile:
+    find_best_additions chooses the names, then get_final_allocation sizes them on
+    the sample covariance of that small set.
+
+    Returns:
+        tuple: (pd.Series of final weights by ticker, selection dict from find_best_additions)
+    """
+    selection = find_best_additions(holding_weights, num_new_stocks, max_allocation, sell_enabled,
+                                    current_value=current_value, budget=budget, **selection_options)
+    returns = get_universe_factor_model(selection_options.get('start_date'), selection_options.get('end_date'),
+                                        selection_options.get('num_factors', 5))[0][selection['tickers']]
+    current_weights = holding_weights.reindex(selection['tickers']).fillna(0).values * _invested_fraction(current_value, budget)
+    final_weights = get_final_allocation(returns.mean(), returns.cov(), target_profile, risk_free_rate,
+                                         current_weights, max_allocation, sell_enabled)
+    return pd.Series(final_weights, index=selection['tickers']), selection
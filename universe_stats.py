@@ -0,0 +1,91 @@
+# In universe_stats.py
+
+import os
+import numpy as np
+import pandas as pd
+
+from price_store import load_universe_prices
+
+STATS_CACHE_FILE = 'sp500_stats.parquet'
+
+# Trailing-return horizons, in trading days.
+RETURN_HORIZONS = {'1m Return': 21, '3m Return': 63, '6m Return': 126, '12m Return': 252}
+
+_universe_stats = None
+
+
+def build_universe_stats(prices, volumes=None):
+    """
+    Computes one row of per-stock statistics from the price (and optional volume) matrix.
+
+    Args:
+        prices (pd.DataFrame): Daily closing prices (dates x tickers), sorted by date.
+        volumes (pd.DataFrame): Optional daily share volumes, same shape as prices.
+
+    Returns:
+        pd.DataFrame: Indexed by ticker with 'Last Price', trailing returns,
+        'Volatility' (annualized), 'Beta' (to the equal-weighted universe),
+        'Max Drawdown' and, when volumes are given, 'Avg Dollar Volume (3m)'.
+    """
+    returns = prices.pct_change().dropna(how='all')
+    stats = pd.DataFrame(index=prices.columns)
+    stats.index.name = 'Ticker'
+    stats['Last Price'] = prices.iloc[-1]
+
+    for column, days in RETURN_HORIZONS.items():
+        stats[column] = prices.iloc[-1] / prices.iloc[-1 - days] - 1 if len(prices) > days else np.nan
+
+    stats['Volatility'] = returns.std() * np.sqrt(252)
+    market = returns.mean(axis=1)
+    market_centered = market - market.mean()
+    stats['Beta'] = (returns - returns.mean()).T.dot(market_centered) / market_centered.dot(market_centered)
+    stats['Max Drawdown'] = (prices / prices.cummax() - 1).min()
+
+    if volumes is not None:
+        dollar_volume = (volumes.reindex_like(prices) * prices).iloc[-63:]
+        stats['Avg Dollar Volume (3m)'] = dollar_volume.mean()
+    return stats
+
+
+def save_universe_stats(stats, cache_file=STATS_CACHE_FILE):
+    """Writes the statistics table next to the price cache."""
+    stats.to_parquet(cache_file)
+
+
+def load_universe_stats():
+    """
+    Loads the materialized statistics table once per process. If the table has not
+    been built yet, it is computed from the price cache in memory.
+    """
+    global _universe_stats
+    if _universe_stats is None:
+        if os.path.exists(STATS_CACHE_FILE):
+            _universe_stats = pd.read_parquet(STATS_CACHE_FILE)
+        else:
+            print(f"Statistics cache '{STATS_CACHE_FILE}' not found. Computing it from the price cache.")
+            prices = load_universe_prices()
+            _universe_stats = build_universe_stats(prices) if not prices.empty else pd.DataFrame()
+    return _universe_stats
+
+
+def refresh_universe_stats():
+    """
+    Nightly job: rebuilds the statistics table from the current price cache.
+    Run with `python universe_stats.py` after the price cache is refreshed.
+    """
+    prices = load_universe_prices()
+    if prices.empty:
+        print("ERROR: The price cache is empty. Run setup_data.py first.")
+        return
+    stats = build_universe_stats(prices)
+    # Volumes are only downloaded by setup_data.py, so carry the last liquidity figures forward.
+    if os.path.exists(STATS_CACHE_FILE):
+        previous = pd.read_parquet(STATS_CACHE_FILE)
+        if 'Avg Dollar Volume (3m)' in previous.columns:
+            stats['Avg Dollar Volume (3m)'] = previous['Avg Dollar Volume (3m)']
+    save_universe_stats(stats)
+    print(f"...Statistics cache ('{STATS_CACHE_FILE}') is ready with {len(stats)} tickers.")
+
+
+if __name__ == '__main__':
+    refresh_universe_stats()
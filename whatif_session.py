@@ -0,0 +1,234 @@
+# In whatif_session.py
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from scipy.linalg import cholesky, solve_triangular
+from scipy.optimize import minimize
+
+from portfolio_optimizer import get_final_allocation, risk_parity_scale
+
+# How many what-if sessions (one per analyzed portfolio and window) each process keeps.
+MAX_SESSIONS = 64
+
+_sessions = OrderedDict()
+
+
+def _cholesky_update(factor, vector):
+    """Lower Cholesky factor of factor @ factor.T + vector vector^T, in O(n^2)."""
+    factor, vector = factor.copy(), vector.copy()
+    for k in range(len(vector)):
+        radius = np.hypot(factor[k, k], vector[k])
+        cos, sin = radius / factor[k, k], vector[k] / factor[k, k]
+        factor[k, k] = radius
+        factor[k + 1:, k] = (factor[k + 1:, k] + sin * vector[k + 1:]) / cos
+        vector[k + 1:] = cos * vector[k + 1:] - sin * factor[k + 1:, k]
+    return factor
+
+
+# --- Objectives on the Cholesky factor (value and analytic gradient) ---
+def _scaled_variance(weights, factor, scale):
+    """w^T S w = ||L^T w||^2 with gradient 2 L L^T w, divided by scale (a typical variance)."""
+    projected = factor.T @ weights
+    return projected @ projected / scale, 2 * (factor @ projected) / scale
+
+
+def _risk_parity(weights, factor, periods_per_year, scale):
+    """
+    The risk-parity objective of get_final_allocation, std of w * (S w) / sigma_a, with
+    S w = L L^T w, and its gradient.
+    """
+    n = len(weights)
+    marginal = factor @ (factor.T @ weights)
+    variance = weights @ marginal
+    if variance <= 0:
+        return 0.0, np.zeros(n)
+    annual_vol = np.sqrt(variance * periods_per_year)
+    contributions = weights * marginal / annual_vol
+    spread = np.std(contributions)
+    if spread == 0:
+        return 0.0, np.zeros(n)
+    a = (contributions - contributions.mean()) / (n * spread)
+    gradient = (a * marginal + factor @ (factor.T @ (a * weights))) / annual_vol - (a @ contributions) * marginal / variance
+    return spread / scale, gradient / scale
+
+
+class WhatIfSession:
+    """
+    Keeps the covariance, its Cholesky factor and the last optimal weights for the
+    currently selected assets, so toggling a candidate in and out is cheap.
+
+    Adding k assets borders the covariance with their k columns (O(T n k)) and
+    extends the factor with a rank-k block; removing an asset drops its row and
+    column and restores the factor with a rank-1 update. Each re-solve works on
+    the factor with analytic gradients and is warm-started from the previous
+    weights instead of equal weights.
+
+    Sessions are shared between a worker's threads, so hold session.lock around
+    a select() and the solve() that follows it.
+
+    Args:
+        pool_returns (pd.DataFrame): Returns of every asset that may be selected,
+            on one common set of dates.
+        tickers (list): The initial selection.
+    """
+
+    def __init__(self, pool_returns, tickers=()):
+        self.lock = threading.RLock()
+        self.pool = pool_returns
+        self._centered = (pool_returns - pool_returns.mean()).values
+        self._means = pool_returns.mean()
+        self._position = {t: i for i, t in enumerate(pool_returns.columns)}
+        self.tickers = []
+        self.cov = np.empty((0, 0))
+        self.factor = np.empty((0, 0))
+        self.weights = None
+        self.add(tickers)
+
+    def _cross_cov(self, rows, columns):
+        rows, columns = [self._position[t] for t in rows], [self._position[t] for t in columns]
+        return self._centered[:, rows].T @ self._centered[:, columns] / (len(self._centered) - 1)
+
+    def add(self, tickers):
+        """Borders the covariance and factor with the new tickers (a rank-k extension)."""
+        new = [t for t in dict.fromkeys(tickers) if t not in self.tickers]
+        missing = [t for t in new if t not in self._position]
+        if missing:
+            raise KeyError(f"No returns in this session for: {missing}")
+        if not new:
+            return
+
+        cross = self._cross_cov(new, self.tickers)           # k x n
+        block = self._cross_cov(new, new)                    # k x k
+        if self.tickers:
+            border = solve_triangular(self.factor, cross.T, lower=True).T
+        else:
+            border = np.empty((len(new), 0))
+        try:
+            corner = cholesky(block - border @ border.T, lower=True)
+        except np.linalg.LinAlgError:
+            # A new asset is (numerically) a combination of the others; a small ridge keeps the factor usable.
+            corner = cholesky(block - border @ border.T + 1e-12 * np.eye(len(new)), lower=True)
+
+        n, k = len(self.tickers), len(new)
+        cov = np.empty((n + k, n + k))
+        cov[:n, :n], cov[n:, :n], cov[:n, n:], cov[n:, n:] = self.cov, cross, cross.T, block
+        factor = np.zeros((n + k, n + k))
+        factor[:n, :n], factor[n:, :n], factor[n:, n:] = self.factor, border, corner
+        self.cov, self.factor = cov, factor
+
+        if self.weights is not None:
+            # Warm start: the new names come in at an equal share, the rest scaled down to make room.
+            share = 1.0 / (n + k)
+            self.weights = pd.concat([self.weights * (1 - k * share), pd.Series(share, index=new)])
+        self.tickers = self.tickers + new
+
+    def remove(self, tickers):
+        """Drops tickers from the selection, restoring the factor with one rank-1 update per ticker."""
+        for ticker in tickers:
+            if ticker not in self.tickers:
+                continue
+            i = self.tickers.index(ticker)
+            trailing = self.factor[i + 1:, i + 1:]
+            if len(trailing):
+                trailing = _cholesky_update(trailing, self.factor[i + 1:, i])
+            keep = [j for j in range(len(self.tickers)) if j != i]
+            factor = self.factor[np.ix_(keep, keep)]
+            factor[i:, i:] = trailing
+            self.factor = factor
+            self.cov = self.cov[np.ix_(keep, keep)]
+            self.tickers = [t for t in self.tickers if t != ticker]
+            if self.weights is not None:
+                remaining = self.weights.drop(ticker)
+                self.weights = remaining / remaining.sum() if remaining.sum() > 0 else None
+
+    def select(self, tickers):
+        """Makes tickers the selection, adding and removing only what changed."""
+        self.remove([t for t in self.tickers if t not in tickers])
+        self.add(tickers)
+
+    def covariance(self):
+        """The selection's covariance as a DataFrame (same values as pool[tickers].cov())."""
+        return pd.DataFrame(self.cov, index=self.tickers, columns=self.tickers)
+
+    def volatility(self, weights, periods_per_year=252):
+        """Annualized volatility from the factor: ||L^T w|| * sqrt(periods_per_year)."""
+        return float(np.linalg.norm(self.factor.T @ np.asarray(weights, dtype=float)) * np.sqrt(periods_per_year))
+
+    def solve(self, target_profile, risk_free_rate, current_weights, max_allocation, sell_enabled, periods_per_year=252):
+        """
+        Re-optimizes the current selection for the same profiles and constraints as
+        get_final_allocation, but with SLSQP on the Cholesky factor (variance is
+        ||L^T w||^2) and analytic gradients, warm-started from the last solution.
+        If that solve fails, get_final_allocation (and its fallbacks) decides.
+
+        Args:
+            current_weights (pd.Series): Current weights by ticker (missing tickers count as 0).
+
+        Returns:
+            pd.Series: Optimal weights by ticker, in selection order.
+        """
+        # Imported here so the process-pool machinery stays off the startup path.
+        from multistart_optimizer import project_to_bounds
+
+        n = len(self.tickers)
+        means = self._means[self.tickers].values
+        current = current_weights.reindex(self.tickers).fillna(0).values
+        upper = np.full(n, float(max_allocation))
+        lower = np.zeros(n) if sell_enabled else np.minimum(current, upper)
+        start = np.full(n, 1.0 / n) if self.weights is None else self.weights.reindex(self.tickers).values
+        start = project_to_bounds(start, lower, upper)
+
+        # Same profile switch as get_final_allocation.
+        if target_profile == 'balanced' and means.mean() * periods_per_year < risk_free_rate:
+            target_profile = 'min_risk'
+
+        constraints = [{'type': 'eq', 'fun': lambda w: np.sum(w) - 1, 'jac': lambda w: np.ones(n)}]
+        if target_profile == 'balanced':
+            objective = _risk_parity
+            args = (self.factor, periods_per_year, risk_parity_scale(self.cov, periods_per_year))
+        else:
+            objective = _scaled_variance
+            args = (self.factor, np.mean(np.diag(self.cov)))
+            if target_profile == 'high_growth':
+                annual_means = means * periods_per_year
+                target_return = np.percentile(annual_means, 75)
+                constraints.append({'type': 'eq', 'fun': lambda w: w @ annual_means - target_return,
+                                    'jac': lambda w: annual_means})
+
+        result = minimize(objective, start, args=args, jac=True, method='SLSQP', bounds=list(zip(lower, upper)),
+                          constraints=constraints, options={'ftol': 1e-10, 'maxiter': 500})
+        feasible = abs(result.x.sum() - 1) < 1e-6 and np.all(result.x >= lower - 1e-8) and np.all(result.x <= upper + 1e-8)
+        if result.success and feasible:
+            weights = np.clip(result.x, 0, None)
+            weights[np.isclose(weights, 0)] = 0
+            weights /= weights.sum()
+        else:
+            weights = get_final_allocation(self._means[self.tickers], self.covariance(), target_profile, risk_free_rate,
+                                           current, max_allocation, sell_enabled, initial_weights=start,
+                                           periods_per_year=periods_per_year)
+        self.weights = pd.Series(weights, index=self.tickers)
+        return self.weights
+
+
+_sessions_lock = threading.Lock()
+
+
+def get_whatif_session(key, load_pool_returns):
+    """
+    Returns the process's WhatIfSession for key (e.g. the analyzed portfolio, its
+    candidates and window). On first use the session is built from load_pool_returns().
+    """
+    with _sessions_lock:
+        if key in _sessions:
+            _sessions.move_to_end(key)
+            return _sessions[key]
+
+    session = WhatIfSession(load_pool_returns())
+    with _sessions_lock:
+        session = _sessions.setdefault(key, session)
+        if len(_sessions) > MAX_SESSIONS:
+            _sessions.popitem(last=False)
+    return session